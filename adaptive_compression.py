@@ -0,0 +1,70 @@
+"""
+Adaptive zlib level selection for PNG saves.
+
+The controller starts at the highest allowed level and steps down one level
+whenever the next batch is expected to take longer than the target latency
+or saves are queuing up behind each other, then steps back up once batches
+are expected to finish well inside the target with nothing pending.
+
+The expectation is the next batch's raw pixel bytes times the time per byte
+the last batch took, so a large image after small ones is judged by its own
+size rather than by the small ones' latency.
+"""
+
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptiveCompression:
+    """
+    Per-node compression level controller fed with measured save latency.
+
+    choose() is called on the executor thread before a batch is encoded;
+    record() is called with the batch's encode+write time and raw pixel bytes,
+    possibly later from a background save thread.
+    """
+
+    # Step back up only when the last batch used less than this share of the target
+    HEADROOM = 0.5
+
+    def __init__(self):
+        self.level = None
+        self._seconds_per_byte = None
+        self._lock = threading.Lock()
+
+    def choose(self, min_level, max_level, target_ms, nbytes, queue_depth=0):
+        """
+        Return the zlib level to use for the next batch.
+
+        Args:
+            min_level: Lowest level the controller may pick
+            max_level: Highest level the controller may pick
+            target_ms: Target encode+write latency per batch
+            nbytes: Raw pixel bytes of the next batch
+            queue_depth: Number of batches still waiting in the background queue
+        """
+        min_level, max_level = sorted((min_level, max_level))
+        target = target_ms / 1000.0
+        with self._lock:
+            level = max_level if self.level is None else self.level
+            rate, self._seconds_per_byte = self._seconds_per_byte, None
+            expected = None if rate is None else rate * nbytes
+
+            if queue_depth > 1 or (expected is not None and expected > target):
+                level -= 1
+            elif expected is not None and expected < target * self.HEADROOM and queue_depth == 0:
+                level += 1
+
+            self.level = max(min_level, min(max_level, level))
+            return self.level
+
+    def record(self, level, seconds, nbytes):
+        """Feed back the measured latency and raw pixel bytes of a finished batch."""
+        if nbytes <= 0:
+            return
+        with self._lock:
+            self._seconds_per_byte = seconds / nbytes
+        logger.debug("MetaSaver: compress_level=%d encoded %d pixel bytes in %.1f ms (%.1f MB/s)",
+                     level, nbytes, seconds * 1000.0, nbytes / max(seconds, 1e-9) / 1e6)
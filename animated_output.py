@@ -0,0 +1,140 @@
+"""
+Single-file multi-frame output: a whole IMAGE batch as one APNG or animated WebP.
+
+The metadata chunks are written once for the file instead of once per image.
+Fields that carry one value per frame (a list as long as the batch, e.g. the
+seeds of a variation sweep) are moved into a frame-indexed "frames" list in
+custom_metadata.
+
+APNG frames are quantized, filtered and compressed one at a time straight
+from the tensor with the streaming PNG writer, so only one frame is ever
+held as 8-bit pixels. Animated WebP goes through PIL, which is handed
+zero-copy views of the quantized batch.
+"""
+
+import os
+import struct
+import time
+import zlib
+
+from PIL import Image
+
+from .filename_allocator import removed_on_error
+from .instrumentation import NULL_STATS
+from .png_stream import IdatWriter, filtered_strips, write_chunk, write_header
+
+MULTI_FRAME_FORMATS = ("png", "webp")
+
+
+def frame_metadata(custom_metadata, frame_count):
+    """
+    Move per-frame field values into a frame-indexed "frames" list.
+
+    A field is per-frame when its value is a list with one item per frame.
+
+    Args:
+        custom_metadata: The formatted custom fields
+        frame_count: Number of frames in the file
+    """
+    per_frame = [key for key, value in custom_metadata.items()
+                 if isinstance(value, list) and len(value) == frame_count]
+    if frame_count < 2 or not per_frame:
+        return custom_metadata
+    result = {key: value for key, value in custom_metadata.items() if key not in per_frame}
+    result["frames"] = [{key: custom_metadata[key][n] for key in per_frame}
+                        for n in range(frame_count)]
+    return result
+
+
+class _FdatWriter(IdatWriter):
+    """IdatWriter for the frames after the first, which go in numbered fdAT chunks."""
+
+    def __init__(self, f, sequence):
+        super().__init__(f)
+        self.sequence = sequence
+
+    def _write_chunk(self, data):
+        write_chunk(self.f, b"fdAT", struct.pack(">I", self.sequence) + data)
+        self.sequence += 1
+
+
+def write_apng(images, path, pnginfo=None, compress_level=4, duration_ms=100):
+    """
+    Write an IMAGE batch as one APNG, frame by frame.
+
+    Returns the number of bytes written.
+
+    Args:
+        images: IMAGE tensor [B, H, W, C] with values in 0..1
+        path: Output file path
+        pnginfo: PngInfo with the metadata text chunks, written once
+        compress_level: zlib level (0-9)
+        duration_ms: Display time of each frame
+    """
+    frames, height, width, channels = images.shape
+    with removed_on_error(path):
+        with open(path, "wb") as f:
+            write_header(f, width, height, channels, pnginfo)
+            # Frame count, and 0 plays meaning loop forever
+            write_chunk(f, b"acTL", struct.pack(">II", frames, 0))
+            sequence = 0
+            for n in range(frames):
+                # Full-size frame at 0,0; dispose none, blend source
+                write_chunk(f, b"fcTL", struct.pack(">IIIIIHHBB", sequence, width, height, 0, 0,
+                                                    duration_ms, 1000, 0, 0))
+                sequence += 1
+                writer = IdatWriter(f) if n == 0 else _FdatWriter(f, sequence)
+                compressor = zlib.compressobj(compress_level, zlib.DEFLATED, 15, 9)
+                for strip in filtered_strips(images[n], filter_rows=compress_level > 0):
+                    writer.write(compressor.compress(strip))
+                writer.write(compressor.flush())
+                writer.close()
+                if n > 0:
+                    sequence = writer.sequence
+            write_chunk(f, b"IEND", b"")
+            return f.tell()
+
+
+def write_animated_webp(pixels, path, exif, options):
+    """
+    Write a quantized batch as one animated WebP. Returns the number of bytes written.
+
+    Args:
+        pixels: uint8 array [B, H, W, C] from quantize_batch
+        path: Output file path
+        exif: EXIF metadata built by the WebP engine, written once
+        options: Encoder settings (lossless, quality, effort, frame_duration_ms)
+    """
+    with removed_on_error(path):
+        frames = [Image.fromarray(frame) for frame in pixels]
+        frames[0].save(path, format="WEBP", save_all=True, append_images=frames[1:],
+                       duration=options["frame_duration_ms"], loop=0, exif=exif,
+                       lossless=options.get("lossless", True),
+                       quality=options.get("quality", 90),
+                       method=options.get("effort", 4))
+        return os.path.getsize(path)
+
+
+def multi_frame_batch(images, items, engine, options, mode="sequential", workers=0,
+                      stats=NULL_STATS):
+    """
+    encode_batch counterpart that writes the whole batch into the single item's file.
+
+    Args:
+        images: IMAGE tensor [B, H, W, C] for APNG, or the quantized batch for WebP
+        items: The one (batch_index, path, metadata) tuple of the file
+        engine: Format engine name (one of MULTI_FRAME_FORMATS)
+        options: Encoder settings, including frame_duration_ms
+        mode: Ignored, frames are encoded in order
+        workers: Ignored
+        stats: SaveStats that receives the encode time and size
+    """
+    for _, path, metadata in items:
+        start = time.perf_counter()
+        if engine == "png":
+            nbytes = write_apng(images, path, metadata, options["compress_level"],
+                                options["frame_duration_ms"])
+        else:
+            nbytes = write_animated_webp(images, path, metadata, options)
+        stats.add_time("encode", time.perf_counter() - start)
+        stats.add_file(nbytes)
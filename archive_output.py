@@ -0,0 +1,170 @@
+"""
+Tar shard output for dataset generation, in the WebDataset layout.
+
+Instead of one file per image, archive mode appends the encoded images to a
+rolling tar file per prefix through a single open handle:
+
+    output/<prefix>-000000.tar      members <prefix>_000000_000000.png, ...
+    output/<prefix>-000000.jsonl    one line per member
+
+Once a shard reaches the configured size the next image starts a new one.
+Each manifest line holds the member's key, name, data offset and size in the
+tar, the custom_metadata and a SHA-256 of the prompt, so a dataset can be
+filtered and read with plain seeks without opening the images.
+
+A new process never appends to existing shards; it starts after the highest
+shard number in the folder, claiming the name with an exclusive create, so
+several processes can write the same prefix.
+"""
+
+import atexit
+import io
+import json
+import os
+import re
+import tarfile
+import threading
+import time
+
+from .formats import get_engine
+from .instrumentation import NULL_STATS
+from .parallel_encode import encode_batch_to_memory
+
+
+class TarShardWriter:
+    """Appends encoded images and manifest lines to the rolling shards of one prefix."""
+
+    def __init__(self, folder, name, shard_bytes):
+        self.folder = folder
+        self.name = name
+        self.shard_bytes = shard_bytes
+        self._lock = threading.Lock()
+        self._file = None
+        self._tar = None
+        self._manifest = None
+        self._shard = self._highest_shard()
+        self._count = 0
+
+    def _highest_shard(self):
+        pattern = re.compile(re.escape(self.name) + r"-(\d{6,})\.tar$")
+        try:
+            shards = [int(m.group(1)) for m in map(pattern.match, os.listdir(self.folder)) if m]
+        except FileNotFoundError:
+            shards = []
+        return max(shards, default=-1)
+
+    def _open_next(self):
+        self._close_shard()
+        os.makedirs(self.folder, exist_ok=True)
+        while True:
+            self._shard += 1
+            path = os.path.join(self.folder, f"{self.name}-{self._shard:06}.tar")
+            try:
+                self._file = open(path, "xb")
+                break
+            except FileExistsError:
+                # Another process started this shard first
+                continue
+        self._tar = tarfile.open(fileobj=self._file, mode="w", format=tarfile.USTAR_FORMAT)
+        self._manifest = open(os.path.join(self.folder, f"{self.name}-{self._shard:06}.jsonl"),
+                              "w", encoding="utf-8")
+        self._count = 0
+
+    def _close_shard(self):
+        if self._tar is not None:
+            self._tar.close()
+            self._file.close()
+            self._manifest.close()
+            self._tar = self._file = self._manifest = None
+
+    def add(self, data, extension, record):
+        """
+        Append one encoded image and its manifest line.
+
+        Returns (shard file name, member name).
+
+        Args:
+            data: Encoded image bytes
+            extension: File extension of the member
+            record: Manifest fields for this image (custom_metadata, prompt_sha256, ...)
+        """
+        with self._lock:
+            if self._tar is None or self._file.tell() >= self.shard_bytes:
+                self._open_next()
+            key = f"{self.name}_{self._shard:06}_{self._count:06}"
+            self._count += 1
+            info = tarfile.TarInfo(f"{key}.{extension}")
+            info.size = len(data)
+            info.mtime = int(time.time())
+            self._tar.addfile(info, io.BytesIO(data))
+            # The data ends the member, padded to a whole number of blocks
+            offset = self._tar.offset - -(-info.size // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+            line = {"key": key, "member": info.name, "offset": offset,
+                    "size": info.size, **record}
+            self._manifest.write(json.dumps(line, ensure_ascii=False) + "\n")
+            return os.path.basename(self._file.name), info.name
+
+    def flush(self):
+        """Push buffered data to the OS so readers see complete members."""
+        with self._lock:
+            if self._tar is not None:
+                self._file.flush()
+                self._manifest.flush()
+
+    def close(self):
+        """Finish the current shard (end-of-archive blocks); the next add starts a new one."""
+        with self._lock:
+            self._close_shard()
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def get_archive_writer(folder, name, shard_bytes):
+    """Return the shared TarShardWriter for a prefix, updating its shard size."""
+    key = (os.path.abspath(folder), name)
+    with _writers_lock:
+        writer = _writers.get(key)
+        if writer is None:
+            writer = TarShardWriter(folder, name, shard_bytes)
+            _writers[key] = writer
+        writer.shard_bytes = shard_bytes
+        return writer
+
+
+@atexit.register
+def _close_writers():
+    with _writers_lock:
+        writers = list(_writers.values())
+    for writer in writers:
+        writer.close()
+
+
+def archive_batch(writer, records, pixels, items, engine, options, mode="sequential", workers=0,
+                  stats=NULL_STATS):
+    """
+    Encode a quantized batch in memory and append it to the writer's shards in batch order.
+
+    Args:
+        writer: TarShardWriter of the prefix
+        records: Manifest fields of each item, in item order
+        pixels: uint8 array [B, H, W, C] from quantize_batch
+        items: List of (batch_index, metadata) tuples
+        engine: Format engine name
+        options: Encoder settings passed to the engine
+        mode: One of EXECUTOR_MODES, for the encoding
+        workers: Pool size, 0 for one worker per CPU
+        stats: SaveStats that receives the encode and write times and sizes
+    """
+    start = time.perf_counter()
+    encoded = encode_batch_to_memory(pixels, items, engine, options, mode, workers)
+    stats.add_time("encode", time.perf_counter() - start)
+
+    start = time.perf_counter()
+    extension = get_engine(engine).extension
+    for data, record in zip(encoded, records):
+        writer.add(data, extension, record)
+        stats.add_file(len(data))
+    writer.flush()
+    stats.add_time("write", time.perf_counter() - start)
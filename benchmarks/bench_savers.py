@@ -0,0 +1,357 @@
+"""
+Benchmark suite for the MetaSaver nodes.
+
+Runs MetaSaverNode, MetaSaverDynamicNode, MetaVideoSaverNode and
+MetaVideoSaverDynamicNode outside ComfyUI on synthetic data, with a stub
+folder_paths module and a fake VIDEO object, over a matrix of batch sizes,
+resolutions, workflow JSON sizes and compress levels.
+
+For every case it reports the end-to-end node time, per-stage timings
+(tensor conversion, metadata build, encode, write), throughput and peak RSS,
+and compares them against a stored baseline. The stage timings are the
+node's own instrumentation stats (instrumentation="log+ui") of the measured
+call, not a separate reimplementation of the pipeline.
+
+Usage:
+    python benchmarks/bench_savers.py                   # run and compare to baseline
+    python benchmarks/bench_savers.py --quick           # small matrix
+    python benchmarks/bench_savers.py --save-baseline   # record a new baseline
+    python benchmarks/bench_savers.py --json out.json   # also write raw results
+
+Each case runs in a fresh process that only builds the inputs and calls the
+node, so peak RSS is that of the node run. Timings are the minimum over
+--repeat runs. Exits with status 1 when a regression is found.
+"""
+
+import argparse
+import importlib.util
+import itertools
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+import types
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+IMAGE_NODES = ["MetaSaver", "MetaSaverDynamic"]
+VIDEO_NODES = ["MetaVideoSaver", "MetaVideoSaverDynamic"]
+
+# Metrics compared against the baseline (lower is better)
+COMPARED_METRICS = ["total_s", "convert_s", "metadata_s", "encode_s", "write_s", "peak_rss_mb"]
+
+
+# ---------------------------------------------------------------------------
+# Environment stubs
+# ---------------------------------------------------------------------------
+
+def _install_folder_paths(output_dir):
+    """Register a minimal stand-in for ComfyUI's folder_paths module."""
+    module = types.ModuleType("folder_paths")
+
+    def get_output_directory():
+        return output_dir
+
+    def get_temp_directory():
+        return os.path.join(output_dir, "temp")
+
+    def get_save_image_path(filename_prefix, output_dir, image_width=0, image_height=0):
+        subfolder = os.path.dirname(os.path.normpath(filename_prefix))
+        filename = os.path.basename(os.path.normpath(filename_prefix))
+        full_output_folder = os.path.join(output_dir, subfolder)
+        os.makedirs(full_output_folder, exist_ok=True)
+        counter = 1
+        for name in os.listdir(full_output_folder):
+            if name.startswith(filename + "_"):
+                try:
+                    counter = max(counter, int(name[len(filename) + 1:].split("_")[0]) + 1)
+                except ValueError:
+                    pass
+        return full_output_folder, filename, counter, subfolder, filename_prefix
+
+    module.get_output_directory = get_output_directory
+    module.get_temp_directory = get_temp_directory
+    module.get_save_image_path = get_save_image_path
+    sys.modules["folder_paths"] = module
+
+
+def _load_package():
+    """Import the node package from the repository root as 'metasaver'."""
+    if "metasaver" not in sys.modules:
+        spec = importlib.util.spec_from_file_location(
+            "metasaver", os.path.join(REPO_ROOT, "__init__.py"),
+            submodule_search_locations=[REPO_ROOT])
+        package = importlib.util.module_from_spec(spec)
+        sys.modules["metasaver"] = package
+        spec.loader.exec_module(package)
+    return sys.modules["metasaver"]
+
+
+class FakeVideo:
+    """
+    Stand-in for ComfyUI's VIDEO type.
+
+    save_to() converts the frames, JSON-serializes the metadata the way
+    ComfyUI's implementation does and writes raw frames instead of running a
+    codec, so the benchmark measures MetaSaver's own overhead around it.
+    """
+
+    def __init__(self, frames):
+        self.frames = frames
+        self.stages = {}
+
+    def get_dimensions(self):
+        return self.frames.shape[2], self.frames.shape[1]
+
+    def save_to(self, path, format="auto", codec="auto", metadata=None):
+        from metasaver.image_convert import quantize_batch
+
+        start = time.perf_counter()
+        pixels = quantize_batch(self.frames)
+        self.stages["convert_s"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        tags = {key: json.dumps(value) for key, value in (metadata or {}).items()}
+        self.stages["metadata_s"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with open(path, "wb") as f:
+            f.write(json.dumps(tags).encode("utf-8"))
+            f.write(memoryview(pixels).cast("B"))
+        self.stages["write_s"] = time.perf_counter() - start
+        self.stages["encode_s"] = 0.0
+
+
+# ---------------------------------------------------------------------------
+# Synthetic data
+# ---------------------------------------------------------------------------
+
+def _make_images(batch, resolution):
+    import numpy as np
+
+    rng = np.random.default_rng(0)
+    # Smooth gradients plus noise compress more like real renders than pure noise
+    y, x = np.mgrid[0:resolution, 0:resolution].astype(np.float32) / resolution
+    base = np.stack([x, y, (x + y) / 2], axis=-1)
+    images = np.empty((batch, resolution, resolution, 3), dtype=np.float32)
+    for b in range(batch):
+        images[b] = base * 0.8 + rng.random((resolution, resolution, 3), dtype=np.float32) * 0.2
+    try:
+        import torch
+        return torch.from_numpy(images)
+    except ImportError:
+        return images
+
+
+def _make_workflow(size):
+    """Build a prompt-like dict whose JSON encoding is roughly size bytes."""
+    workflow = {}
+    i = 0
+    while len(json.dumps(workflow)) < size:
+        workflow[str(i)] = {
+            "class_type": f"Node{i % 37}",
+            "inputs": {"text": "a detailed prompt fragment " * 8, "seed": i * 7919, "cfg": 7.5},
+        }
+        i += 1
+    return workflow
+
+
+def _custom_fields():
+    return {"meta_name_0": "seed", "meta_value_0": 123456789,
+            "meta_name_1": "positive_prompt", "meta_value_1": "a beautiful landscape",
+            "meta_name_2": "cfg", "meta_value_2": 7.5}
+
+
+# ---------------------------------------------------------------------------
+# Case execution (runs in a child process)
+# ---------------------------------------------------------------------------
+
+def _peak_rss_mb():
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _stage_metrics(record):
+    """Map a node's instrumentation record to the benchmark's stage metrics."""
+    stages = record["stages_s"]
+    return {
+        "convert_s": stages.get("convert", 0.0),
+        "metadata_s": stages.get("metadata", 0.0),
+        "encode_s": stages.get("encode", 0.0),
+        "write_s": stages.get("write", 0.0),
+        "bytes_written": record["bytes_written"],
+    }
+
+
+def run_case(case, repeat):
+    """Run one benchmark case and return its metrics."""
+    output_dir = tempfile.mkdtemp(prefix="metasaver-bench-")
+    try:
+        _install_folder_paths(output_dir)
+        pkg = _load_package()
+        nodes = pkg.NODE_CLASS_MAPPINGS
+
+        images = _make_images(case["batch"], case["resolution"])
+        prompt = _make_workflow(case["workflow_bytes"])
+        extra_pnginfo = {"workflow": prompt}
+        fields = _custom_fields()
+
+        best = None
+        for _ in range(repeat):
+            node = nodes[case["node"]]()
+            if case["node"] in IMAGE_NODES:
+                # Measure a cold metadata cache, like the first run of a new workflow
+                pkg.png_metadata._metadata_cache.clear()
+                start = time.perf_counter()
+                result = node.save_images(images, "bench/ComfyUI",
+                                          compress_level=case["compress_level"],
+                                          instrumentation="log+ui", prompt=prompt,
+                                          extra_pnginfo=extra_pnginfo, **fields)
+                total = time.perf_counter() - start
+                stages = _stage_metrics(result["ui"]["metasaver_stats"][0])
+            else:
+                video = FakeVideo(images)
+                start = time.perf_counter()
+                result = node.save_video(video, "bench/video", instrumentation="log+ui",
+                                         prompt=prompt, extra_pnginfo=extra_pnginfo, **fields)
+                total = time.perf_counter() - start
+                stages = _stage_metrics(result["ui"]["metasaver_stats"][0])
+                # Conversion and writing happen inside VIDEO.save_to, which the fake times
+                stages.update(convert_s=video.stages["convert_s"],
+                              write_s=video.stages["write_s"])
+            stages["total_s"] = total
+            if best is None:
+                best = stages
+            else:
+                best = {key: min(best[key], value) for key, value in stages.items()}
+
+        megapixels = case["batch"] * case["resolution"] ** 2 / 1e6
+        best["images_per_s"] = case["batch"] / best["total_s"]
+        best["megapixels_per_s"] = megapixels / best["total_s"]
+        best["peak_rss_mb"] = _peak_rss_mb()
+        return best
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+
+# ---------------------------------------------------------------------------
+# Matrix, reporting and baseline comparison
+# ---------------------------------------------------------------------------
+
+def build_matrix(args):
+    cases = []
+    for node, batch, resolution, workflow_bytes in itertools.product(
+            IMAGE_NODES + VIDEO_NODES, args.batch, args.resolution, args.workflow_kb):
+        levels = args.compress_level if node in IMAGE_NODES else [None]
+        for level in levels:
+            cases.append({
+                "node": node,
+                "batch": batch,
+                "resolution": resolution,
+                "workflow_bytes": workflow_bytes * 1024,
+                "compress_level": level,
+            })
+    return cases
+
+
+def case_key(case):
+    key = f"{case['node']}/b{case['batch']}/{case['resolution']}px/wf{case['workflow_bytes'] // 1024}k"
+    if case["compress_level"] is not None:
+        key += f"/c{case['compress_level']}"
+    return key
+
+
+def compare(results, baseline, threshold):
+    """Return a list of (case, metric, baseline, current) regressions."""
+    regressions = []
+    for key, metrics in results.items():
+        reference = baseline.get(key)
+        if reference is None:
+            continue
+        for metric in COMPARED_METRICS:
+            old, new = reference.get(metric), metrics.get(metric)
+            # Ignore sub-millisecond stages, which are dominated by timer noise
+            if old is None or new is None or (metric.endswith("_s") and old < 1e-3):
+                continue
+            if new > old * (1 + threshold):
+                regressions.append((key, metric, old, new))
+    return regressions
+
+
+def print_table(results):
+    header = (f"{'case':<52} {'total ms':>9} {'convert':>8} {'metadata':>9} "
+              f"{'encode':>8} {'write':>7} {'img/s':>7} {'MP/s':>7} {'RSS MB':>7}")
+    print(header)
+    print("-" * len(header))
+    for key, m in results.items():
+        print(f"{key:<52} {m['total_s'] * 1000:>9.1f} {m['convert_s'] * 1000:>8.1f} "
+              f"{m['metadata_s'] * 1000:>9.1f} {m['encode_s'] * 1000:>8.1f} "
+              f"{m['write_s'] * 1000:>7.1f} {m['images_per_s']:>7.1f} "
+              f"{m['megapixels_per_s']:>7.1f} {m['peak_rss_mb']:>7.0f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the MetaSaver nodes")
+    parser.add_argument("--batch", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--resolution", type=int, nargs="+", default=[512, 1024])
+    parser.add_argument("--workflow-kb", type=int, nargs="+", default=[16, 512])
+    parser.add_argument("--compress-level", type=int, nargs="+", default=[1, 4, 9])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--quick", action="store_true",
+                        help="Small matrix: batch 2, 256px, 16 KB workflow, level 4")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=0.15,
+                        help="Relative slowdown that counts as a regression (default 0.15)")
+    parser.add_argument("--json", help="Write raw results to this file")
+    args = parser.parse_args(argv)
+
+    if args.quick:
+        args.batch, args.resolution, args.workflow_kb, args.compress_level = [2], [256], [16], [4]
+        args.repeat = 1
+
+    results = {}
+    context = multiprocessing.get_context("spawn")
+    for case in build_matrix(args):
+        # A fresh process per case keeps peak RSS and caches independent
+        with context.Pool(1, maxtasksperchild=1) as pool:
+            results[case_key(case)] = pool.apply(run_case, (case, args.repeat))
+
+    print_table(results)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"\nBaseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to record one")
+        return 0
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.threshold)
+    if not regressions:
+        print(f"\nNo regressions against {args.baseline} (threshold {args.threshold:.0%})")
+        return 0
+
+    print(f"\nREGRESSIONS against {args.baseline} (threshold {args.threshold:.0%}):")
+    for key, metric, old, new in regressions:
+        print(f"  {key} {metric}: {old:.4g} -> {new:.4g} (+{(new / old - 1):.0%})")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,41 @@
+"""
+Free the space of deduplicated outputs that were deleted.
+
+With dedup on, every distinct output is hard-linked into the object store in
+output/.metasaver_objects, so deleting the output files alone does not free
+their space. This removes the stored outputs no output file links to any
+more. Workflow sidecars are kept.
+
+Usage:
+    python prune_objects.py path/to/ComfyUI/output --dry-run
+    python prune_objects.py path/to/ComfyUI/output
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from object_store import get_object_store  # noqa: E402
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Remove unused outputs from the dedup store")
+    parser.add_argument("output_dir", help="ComfyUI output directory holding .metasaver_objects")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Print what would be removed without removing it")
+    args = parser.parse_args(argv)
+
+    store = get_object_store(args.output_dir)
+    if not os.path.isdir(store.root):
+        print(f"No object store in {args.output_dir}", file=sys.stderr)
+        return 1
+    removed, freed = store.prune(args.dry_run)
+    verb = "Would remove" if args.dry_run else "Removed"
+    print(f"{verb} {removed} unused object(s), {freed / (1024 * 1024):.1f} MiB", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
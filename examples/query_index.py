@@ -0,0 +1,136 @@
+"""
+Query the SQLite metadata index written by MetaSaver's index_metadata option.
+
+Usage:
+    python query_index.py path/to/metasaver_index.sqlite --field seed=12345
+    python query_index.py index.sqlite --field model=sdxl --field "cfg>=7" --format jsonl
+    python query_index.py index.sqlite --prompt-hash 3f2a... --format paths
+    python query_index.py index.sqlite --stats
+
+Field filters take the form NAME=VALUE (exact text match) or NAME<OP>NUMBER
+with OP one of >, >=, <, <= for numeric fields. Multiple filters are ANDed.
+"""
+
+import argparse
+import json
+import re
+import sqlite3
+import sys
+
+FIELD_FILTER = re.compile(r"^(?P<name>[^=<>]+?)\s*(?P<op>>=|<=|=|>|<)\s*(?P<value>.*)$")
+
+
+def build_query(fields=(), prompt_hash=None, subfolder=None, node=None, limit=None):
+    """
+    Build the SQL and parameters for an index query.
+
+    Args:
+        fields: Filters like "seed=123" or "cfg>=7"
+        prompt_hash: Only outputs whose prompt hash starts with this prefix
+        subfolder: Only outputs in this subfolder
+        node: Only outputs saved by this node class
+        limit: Maximum number of rows
+    """
+    where = []
+    params = []
+    for n, expression in enumerate(fields):
+        match = FIELD_FILTER.match(expression)
+        if match is None:
+            raise ValueError(f"Invalid field filter: {expression}")
+        name, op, value = match.group("name").strip(), match.group("op"), match.group("value")
+        if op == "=":
+            where.append(f"EXISTS (SELECT 1 FROM fields f{n} WHERE f{n}.output_id = o.id"
+                         f" AND f{n}.name = ? AND f{n}.value = ?)")
+            params += [name, value]
+        else:
+            where.append(f"EXISTS (SELECT 1 FROM fields f{n} WHERE f{n}.output_id = o.id"
+                         f" AND f{n}.name = ? AND f{n}.num {op} ?)")
+            params += [name, float(value)]
+    if prompt_hash:
+        where.append("o.prompt_hash >= ? AND o.prompt_hash < ?")
+        params += [prompt_hash, prompt_hash + "\uffff"]
+    if subfolder is not None:
+        where.append("o.subfolder = ?")
+        params.append(subfolder)
+    if node:
+        where.append("o.node = ?")
+        params.append(node)
+
+    sql = ("SELECT o.path, o.subfolder, o.filename, o.counter, o.width, o.height, o.format,"
+           " o.node, o.prompt_hash, o.custom_metadata, o.created FROM outputs o")
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY o.subfolder, o.counter"
+    if limit:
+        sql += " LIMIT ?"
+        params.append(limit)
+    return sql, params
+
+
+def query_index(db_path, **filters):
+    """Yield matching outputs as dicts."""
+    sql, params = build_query(**filters)
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    conn.row_factory = sqlite3.Row
+    try:
+        for row in conn.execute(sql, params):
+            record = dict(row)
+            record["custom_metadata"] = json.loads(record["custom_metadata"] or "{}")
+            yield record
+    finally:
+        conn.close()
+
+
+def print_stats(db_path):
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        total = conn.execute("SELECT COUNT(*) FROM outputs").fetchone()[0]
+        print(f"Indexed outputs: {total}")
+        print("\nBy subfolder:")
+        for subfolder, count in conn.execute(
+                "SELECT subfolder, COUNT(*) FROM outputs GROUP BY subfolder ORDER BY 2 DESC"):
+            print(f"  {subfolder or '.'}: {count}")
+        print("\nCustom fields:")
+        for name, count in conn.execute(
+                "SELECT name, COUNT(*) FROM fields GROUP BY name ORDER BY 2 DESC"):
+            print(f"  {name}: {count}")
+    finally:
+        conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query the MetaSaver metadata index")
+    parser.add_argument("db", help="Path to metasaver_index.sqlite")
+    parser.add_argument("--field", action="append", default=[],
+                        help="Field filter NAME=VALUE or NAME>=NUMBER (repeatable)")
+    parser.add_argument("--prompt-hash", help="Prompt hash or hash prefix")
+    parser.add_argument("--subfolder")
+    parser.add_argument("--node", help="Node class name, e.g. MetaSaverNode")
+    parser.add_argument("--limit", type=int)
+    parser.add_argument("--format", choices=["table", "jsonl", "paths"], default="table")
+    parser.add_argument("--stats", action="store_true", help="Print index summary and exit")
+    args = parser.parse_args(argv)
+
+    if args.stats:
+        print_stats(args.db)
+        return 0
+
+    results = query_index(args.db, fields=args.field, prompt_hash=args.prompt_hash,
+                          subfolder=args.subfolder, node=args.node, limit=args.limit)
+    count = 0
+    for record in results:
+        count += 1
+        if args.format == "jsonl":
+            print(json.dumps(record, ensure_ascii=False))
+        elif args.format == "paths":
+            print(record["path"])
+        else:
+            fields = ", ".join(f"{k}={v}" for k, v in record["custom_metadata"].items())
+            print(f"{record['path']:<50} {record['width']}x{record['height']}  {fields}")
+    if args.format == "table":
+        print(f"\n{count} match(es)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,48 +3,121 @@ Example script to read metadata from images saved with MetaSaver node.
 
 Usage:
     python read_metadata.py path/to/image.png
+    python read_metadata.py path/to/image.png --export
+    python read_metadata.py path/to/output_dir --incremental
 """
 
+import os
 import sys
 import json
-from PIL import Image
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image, PngImagePlugin
+
+# Metadata saved with compress_metadata is stored in zTXt/iTXt chunks, which
+# Pillow only decompresses up to 1 MB by default - too small for big workflows
+PngImagePlugin.MAX_TEXT_CHUNK = 64 * 1024 * 1024
+PngImagePlugin.MAX_TEXT_MEMORY = 256 * 1024 * 1024
+
+
+EXIF_IFD = 0x8769
+EXIF_USER_COMMENT = 0x9286
+EXIF_MAKE = 0x010F
+EXIF_MODEL = 0x0110
+
+
+def image_metadata(img):
+    """
+    Collect the MetaSaver text metadata of an opened image as a dict.
+
+    PNG metadata comes straight from the text chunks. WebP and JPEG files keep
+    the workflow in "<key>:<json>" EXIF tags and custom_metadata in the EXIF
+    UserComment, which are mapped back to the same keys.
+    """
+    if img.format == "PNG":
+        return dict(img.info)
+
+    metadata = {}
+    exif = img.getexif()
+    for tag in range(EXIF_MODEL, EXIF_MAKE - 16, -1):
+        value = exif.get(tag)
+        if isinstance(value, str) and ":" in value:
+            key, text = value.split(":", 1)
+            metadata[key] = text
+    comment = exif.get_ifd(EXIF_IFD).get(EXIF_USER_COMMENT)
+    if isinstance(comment, bytes):
+        if comment.startswith(b"UNICODE\0"):
+            metadata["custom_metadata"] = comment[8:].decode("utf-16-le")
+        else:
+            metadata["custom_metadata"] = comment[8:].decode("ascii", "replace")
+    return metadata
+
+
+def resolve_sidecars(info, image_path):
+    """
+    Replace prompt_ref/workflow_ref entries with the JSON they point to.
+
+    Images saved with workflow_sidecar only carry the SHA-256 of their prompt
+    and workflow; the JSON itself lives in the .metasaver_objects store of the
+    output folder, which is looked up in the image's folder and its parents.
+    """
+    refs = {key[:-4]: digest for key, digest in info.items()
+            if key in ("prompt_ref", "workflow_ref")}
+    if not refs:
+        return info
+    directory = os.path.dirname(os.path.abspath(image_path))
+    while not os.path.isdir(os.path.join(directory, ".metasaver_objects")):
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return info
+        directory = parent
+    info = dict(info)
+    for key, digest in refs.items():
+        sidecar = os.path.join(directory, ".metasaver_objects", "workflows", digest[:2],
+                               f"{digest}.json")
+        if os.path.exists(sidecar):
+            with open(sidecar, encoding="utf-8") as f:
+                info[key] = f.read()
+            del info[f"{key}_ref"]
+    return info
 
 
 def read_metadata(image_path):
     """
-    Read and display metadata from a PNG image saved by MetaSaver.
+    Read and display metadata from an image saved by MetaSaver.
 
     Args:
-        image_path: Path to the PNG image file
+        image_path: Path to the PNG, WebP or JPEG image file
     """
     try:
         img = Image.open(image_path)
+        info = resolve_sidecars(image_metadata(img), image_path)
 
         print(f"\n{'='*60}")
         print(f"Metadata for: {image_path}")
         print(f"{'='*60}\n")
 
         # Check if image has metadata
-        if not hasattr(img, 'info') or not img.info:
+        if not info:
             print("No metadata found in this image.")
             return
 
         # Display custom metadata (structured JSON)
-        if "custom_metadata" in img.info:
+        if "custom_metadata" in info:
             print("📋 Custom Metadata (Structured):")
             print("-" * 60)
             try:
-                custom_meta = json.loads(img.info["custom_metadata"])
+                custom_meta = json.loads(info["custom_metadata"])
                 for key, value in custom_meta.items():
                     print(f"  {key}: {value}")
             except json.JSONDecodeError:
-                print(f"  {img.info['custom_metadata']}")
+                print(f"  {info['custom_metadata']}")
             print()
 
         # Display individual metadata fields
         print("🏷️  Individual Metadata Fields:")
         print("-" * 60)
-        meta_fields = {k: v for k, v in img.info.items()
+        meta_fields = {k: v for k, v in info.items()
                       if k.startswith("meta_")}
         if meta_fields:
             for key, value in meta_fields.items():
@@ -55,11 +128,11 @@ def read_metadata(image_path):
         print()
 
         # Display ComfyUI workflow metadata
-        if "prompt" in img.info:
+        if "prompt" in info:
             print("⚙️  ComfyUI Workflow:")
             print("-" * 60)
             try:
-                prompt_data = json.loads(img.info["prompt"])
+                prompt_data = json.loads(info["prompt"])
                 print(f"  Workflow contains {len(prompt_data)} nodes")
                 # Display first few node types
                 node_types = list(set(node.get("class_type", "Unknown")
@@ -70,7 +143,7 @@ def read_metadata(image_path):
             print()
 
         # Display all other metadata keys
-        other_meta = {k: v for k, v in img.info.items()
+        other_meta = {k: v for k, v in info.items()
                      if k not in ["custom_metadata", "prompt", "workflow"]
                      and not k.startswith("meta_")}
         if other_meta:
@@ -92,12 +165,25 @@ def read_metadata(image_path):
         print(f"Error reading metadata: {e}")
 
 
+def json_metadata(info):
+    """Convert raw metadata text values to JSON values where they parse as JSON."""
+    metadata = {}
+    for key, value in info.items():
+        try:
+            # Try to parse as JSON
+            metadata[key] = json.loads(value)
+        except (json.JSONDecodeError, TypeError):
+            # Keep as string if not JSON
+            metadata[key] = str(value)
+    return metadata
+
+
 def export_metadata_json(image_path, output_path=None):
     """
     Export all metadata to a JSON file.
 
     Args:
-        image_path: Path to the PNG image file
+        image_path: Path to the PNG, WebP or JPEG image file
         output_path: Path for output JSON file (optional)
     """
     if output_path is None:
@@ -107,14 +193,7 @@ def export_metadata_json(image_path, output_path=None):
         img = Image.open(image_path)
 
         # Convert all metadata to JSON-serializable format
-        metadata = {}
-        for key, value in img.info.items():
-            try:
-                # Try to parse as JSON
-                metadata[key] = json.loads(value)
-            except (json.JSONDecodeError, TypeError):
-                # Keep as string if not JSON
-                metadata[key] = str(value)
+        metadata = json_metadata(resolve_sidecars(image_metadata(img), image_path))
 
         # Write to file
         with open(output_path, 'w', encoding='utf-8') as f:
@@ -126,15 +205,146 @@ def export_metadata_json(image_path, output_path=None):
         print(f"Error exporting metadata: {e}")
 
 
+CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    metadata TEXT
+)
+"""
+
+
+def file_metadata(image_path):
+    """
+    Read one image's or video's metadata as JSON values, or None if it cannot be read.
+
+    PNG files and MP4/MOV videos go through the readers in scan_metadata.py,
+    which never touch the pixel or media data; other formats are opened
+    with Pillow. Workflow sidecar references are resolved as in
+    export_metadata_json.
+    """
+    from scan_metadata import VIDEO_EXTENSIONS, read_mp4_metadata, read_png_metadata
+
+    try:
+        if image_path.lower().endswith(".png"):
+            info = read_png_metadata(image_path)[0]
+        elif image_path.lower().endswith(VIDEO_EXTENSIONS):
+            info = read_mp4_metadata(image_path)[0]
+        else:
+            with Image.open(image_path) as img:
+                info = image_metadata(img)
+    except Exception as e:
+        print(f"Error reading metadata from {image_path}: {e}", file=sys.stderr)
+        return None
+    return json_metadata(resolve_sidecars(info, image_path))
+
+
+def export_metadata_incremental(directory, output_path=None, cache_path=None, workers=None):
+    """
+    Export the metadata of every image and video under a directory to one JSON file.
+
+    A cache keyed by (path, size, mtime) remembers the metadata of files that
+    were already exported, so a rerun only parses new or changed files and
+    drops entries for files that were deleted. The export is rebuilt from the
+    cache and maps each path, relative to the directory, to its metadata.
+
+    Args:
+        directory: Folder to scan recursively
+        output_path: Path for output JSON file (optional)
+        cache_path: Path for the scan cache database (optional)
+        workers: Worker processes for parsing changed files (default: all CPUs)
+    """
+    from scan_metadata import iter_images
+
+    directory = os.path.abspath(directory)
+    if output_path is None:
+        output_path = os.path.join(directory, "metadata_export.json")
+    if cache_path is None:
+        cache_path = os.path.join(directory, ".metasaver_scan_cache.sqlite")
+
+    conn = sqlite3.connect(cache_path)
+    try:
+        conn.execute(CACHE_SCHEMA)
+        # Files that could not be read never match, so they are retried and a
+        # reader fix picks them up; they are still pruned once deleted
+        cached = {path: None if failed else (size, mtime_ns)
+                  for path, size, mtime_ns, failed
+                  in conn.execute("SELECT path, size, mtime_ns, metadata IS NULL FROM files")}
+
+        # Only stat() while walking; files whose size and mtime match the
+        # cache are not opened at all
+        seen = set()
+        changed = []
+        for image_path in iter_images([directory]):
+            rel_path = os.path.relpath(image_path, directory)
+            try:
+                st = os.stat(image_path)
+            except OSError:
+                continue
+            seen.add(rel_path)
+            key = (st.st_size, st.st_mtime_ns)
+            if cached.get(rel_path) != key:
+                changed.append((rel_path, image_path, key))
+        removed = [path for path in cached if path not in seen]
+
+        if changed:
+            paths = [image_path for _, image_path, _ in changed]
+            if len(paths) < 64 or workers == 0:
+                results = [file_metadata(path) for path in paths]
+            else:
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    results = list(pool.map(file_metadata, paths, chunksize=64))
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO files (path, size, mtime_ns, metadata)"
+                    " VALUES (?, ?, ?, ?)",
+                    ((rel_path, size, mtime_ns,
+                      None if metadata is None else json.dumps(metadata, ensure_ascii=False))
+                     for (rel_path, _, (size, mtime_ns)), metadata in zip(changed, results)))
+        if removed:
+            with conn:
+                conn.executemany("DELETE FROM files WHERE path = ?", ((p,) for p in removed))
+
+        # Stream the merged export straight from the cache, reusing the
+        # stored JSON text instead of re-serializing every entry
+        tmp_path = output_path + ".tmp"
+        count = 0
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("{")
+            for rel_path, metadata in conn.execute(
+                    "SELECT path, metadata FROM files WHERE metadata IS NOT NULL ORDER BY path"):
+                f.write("," if count else "")
+                f.write(f"\n  {json.dumps(rel_path, ensure_ascii=False)}: {metadata}")
+                count += 1
+            f.write("\n}\n")
+        os.replace(tmp_path, output_path)
+    finally:
+        conn.close()
+
+    print(f"✅ Metadata for {count} file(s) exported to: {output_path}")
+    print(f"   {len(changed)} new or changed, {len(removed)} removed, "
+          f"{len(seen) - len(changed)} unchanged")
+
+
 if __name__ == "__main__":
     if len(sys.argv) < 2:
         print("Usage: python read_metadata.py <image_path> [--export]")
+        print("       python read_metadata.py <directory> --incremental [output.json]")
         print("\nOptions:")
-        print("  --export    Export metadata to JSON file")
+        print("  --export         Export metadata to JSON file")
+        print("  --incremental    Export metadata of every image and video in a directory,")
+        print("                   re-reading only new or changed files")
         sys.exit(1)
 
     image_path = sys.argv[1]
 
+    if "--incremental" in sys.argv:
+        index = sys.argv.index("--incremental")
+        output = sys.argv[index + 1] if len(sys.argv) > index + 1 else None
+        export_metadata_incremental(image_path, output)
+        sys.exit(0)
+
     # Read and display metadata
     read_metadata(image_path)
 
@@ -0,0 +1,97 @@
+"""
+Move existing MetaSaver/ComfyUI outputs into a sharded folder layout.
+
+Files named "<prefix>_<counter>_.<ext>" directly in the folder, or in shard
+folders of another layout, are moved to where the saver nodes would put them
+with the chosen shard_layout. Use --layout off to flatten a sharded folder
+again. Other files and folders are left alone.
+
+Usage:
+    python reshard_outputs.py path/to/output/subfolder --layout counter --dry-run
+    python reshard_outputs.py path/to/output/subfolder --layout hash
+    python reshard_outputs.py path/to/output/subfolder --layout counter --shard-size 5000
+
+Note: the metadata index (index_metadata) keeps the old paths of moved files.
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from sharding import OUTPUT_NAME, SHARD_LAYOUTS, shard_folders, shard_subfolder  # noqa: E402
+
+
+def iter_outputs(folder):
+    """Yield paths of output files in folder itself and in its shard folders of any layout."""
+    sources = [folder]
+    for layout in SHARD_LAYOUTS:
+        sources += shard_folders(folder, layout)
+    for source in sources:
+        for entry in os.scandir(source):
+            if entry.is_file() and OUTPUT_NAME.match(entry.name):
+                yield entry.path
+
+
+def reshard(folder, layout, shard_size=1000, dry_run=False):
+    """
+    Move every output file in folder into the shard folder of the given layout.
+
+    Returns the number of files moved.
+
+    Args:
+        folder: Output folder of one filename prefix (e.g. output/ or output/video)
+        layout: Target layout, one of SHARD_LAYOUTS
+        shard_size: Counters per folder for the counter layout
+        dry_run: Only print the moves
+    """
+    moved = 0
+    for path in list(iter_outputs(folder)):
+        name = os.path.basename(path)
+        match = OUTPUT_NAME.match(name)
+        shard = shard_subfolder(layout, match.group("prefix"), int(match.group("counter")),
+                                shard_size)
+        target = os.path.join(folder, shard, name)
+        if os.path.abspath(target) == os.path.abspath(path):
+            continue
+        if os.path.exists(target):
+            print(f"Skipping {path}: {target} already exists", file=sys.stderr)
+            continue
+        if dry_run:
+            print(f"{path} -> {target}")
+        else:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.rename(path, target)
+        moved += 1
+
+    if not dry_run:
+        # Remove shard folders the move left empty, deepest first
+        for other in SHARD_LAYOUTS:
+            for shard in reversed(shard_folders(folder, other)):
+                for directory in (shard, os.path.dirname(shard)):
+                    if directory != folder:
+                        try:
+                            os.rmdir(directory)
+                        except OSError:
+                            pass
+    return moved
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Move outputs into a sharded folder layout")
+    parser.add_argument("folder", help="Folder holding the outputs of a filename prefix")
+    parser.add_argument("--layout", choices=SHARD_LAYOUTS, required=True)
+    parser.add_argument("--shard-size", type=int, default=1000,
+                        help="Files per folder for the counter layout")
+    parser.add_argument("--dry-run", action="store_true", help="Print moves without doing them")
+    args = parser.parse_args(argv)
+
+    moved = reshard(args.folder, args.layout, args.shard_size, args.dry_run)
+    verb = "Would move" if args.dry_run else "Moved"
+    print(f"{verb} {moved} file(s)", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,417 @@
+"""
+Bulk scanner for the metadata of images saved with MetaSaver.
+
+Walks one or more directories and streams one record per image as JSONL or
+CSV. PNG files are never decoded: each file is memory-mapped and only the
+chunk stream in front of the first IDAT chunk is read, so the pixel data is
+never paged in. tEXt, zTXt and iTXt chunks (including compressed ones) are
+all understood. WebP and JPEG files are read through Pillow, which only parses
+their headers. MP4/MOV videos are read by following the box tree with seeks:
+only the moov box's udta/meta and track headers are read, never the media
+data. Files are processed in parallel across a process pool.
+
+Usage:
+    python scan_metadata.py output/ > metadata.jsonl
+    python scan_metadata.py output/ --format csv --fields meta_seed,meta_model -o audit.csv
+    python scan_metadata.py output/ archive/ --workers 16 --parse-json
+    python scan_metadata.py output/video/ --format csv --fields path,width,height,meta_seed
+"""
+
+import argparse
+import csv
+import json
+import mmap
+import os
+import struct
+import sys
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+IMAGE_EXTENSIONS = (".png", ".webp", ".jpg", ".jpeg")
+VIDEO_EXTENSIONS = (".mp4", ".m4v", ".mov")
+DEFAULT_CSV_FIELDS = ["path", "format", "width", "height", "custom_metadata"]
+
+_CHUNK_HEADER = struct.Struct(">I4s")
+_IHDR_SIZE = struct.Struct(">II")
+_BOX_HEADER = struct.Struct(">I4s")
+
+# Names of the iTunes-style atoms FFmpeg writes without movflags=use_metadata_tags
+ITUNES_TAGS = {
+    b"\xa9nam": "title", b"\xa9ART": "artist", b"\xa9alb": "album", b"\xa9cmt": "comment",
+    b"\xa9day": "date", b"\xa9gen": "genre", b"\xa9too": "encoder", b"desc": "description",
+    b"cprt": "copyright",
+}
+
+
+def _decompress(data):
+    # Same guard Pillow uses against decompression bombs, raised to 64 MiB
+    # so large compressed workflows still come through
+    d = zlib.decompressobj()
+    text = d.decompress(data, 64 * 1024 * 1024)
+    if d.unconsumed_tail:
+        raise ValueError("Decompressed text chunk too large")
+    return text
+
+
+def parse_text_chunk(chunk_type, data):
+    """
+    Decode a PNG text chunk into a (key, value) pair.
+
+    Args:
+        chunk_type: b"tEXt", b"zTXt" or b"iTXt"
+        data: Chunk payload without length, type and CRC
+    """
+    key, _, rest = bytes(data).partition(b"\0")
+    key = key.decode("latin-1")
+    if chunk_type == b"tEXt":
+        return key, rest.decode("latin-1")
+    if chunk_type == b"zTXt":
+        # One compression method byte (always 0 = zlib) precedes the stream
+        return key, _decompress(rest[1:]).decode("latin-1")
+    # iTXt: compression flag, method, language tag\0, translated keyword\0, text
+    compressed = rest[0]
+    _, _, rest = rest[2:].partition(b"\0")
+    _, _, text = rest.partition(b"\0")
+    if compressed:
+        text = _decompress(text)
+    return key, text.decode("utf-8")
+
+
+def read_png_metadata(path):
+    """
+    Read the text metadata and size of a PNG without touching its pixel data.
+
+    Returns a (metadata, width, height) tuple. Only the chunks in front of
+    the first IDAT chunk are read; ComfyUI and MetaSaver always write their
+    text chunks there.
+
+    Args:
+        path: Path to the PNG file
+    """
+    metadata = {}
+    width = height = None
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if mm[:8] != PNG_SIGNATURE:
+                raise ValueError("Not a PNG file")
+            view = memoryview(mm)
+            try:
+                pos = 8
+                end = len(mm)
+                while pos + 8 <= end:
+                    length, chunk_type = _CHUNK_HEADER.unpack_from(mm, pos)
+                    data_start = pos + 8
+                    if chunk_type in (b"IDAT", b"IEND"):
+                        break
+                    if data_start + length > end:
+                        raise ValueError(f"Truncated {chunk_type.decode('latin-1')} chunk")
+                    if chunk_type == b"IHDR":
+                        width, height = _IHDR_SIZE.unpack_from(mm, data_start)
+                    elif chunk_type in (b"tEXt", b"zTXt", b"iTXt"):
+                        key, value = parse_text_chunk(chunk_type,
+                                                      view[data_start:data_start + length])
+                        metadata[key] = value
+                    # Skip payload and CRC
+                    pos = data_start + length + 4
+            finally:
+                view.release()
+    return metadata, width, height
+
+
+def _iter_boxes(f, start, end):
+    """Yield (type, payload start, box end) for the boxes between two file offsets."""
+    pos = start
+    while pos + 8 <= end:
+        f.seek(pos)
+        size, box_type = _BOX_HEADER.unpack(f.read(8))
+        header = 8
+        if size == 1:
+            size = struct.unpack(">Q", f.read(8))[0]
+            header = 16
+        elif size == 0:
+            # Extends to the end of the enclosing box (or file)
+            size = end - pos
+        if size < header or pos + size > end:
+            raise ValueError(f"Bad {box_type.decode('latin-1')} box at offset {pos}")
+        yield box_type, pos + header, pos + size
+        pos += size
+
+
+def _parse_data_box(data):
+    """Decode the value of an ilst item's "data" box."""
+    if len(data) < 16 or data[4:8] != b"data":
+        return None
+    well_known_type = int.from_bytes(data[9:12], "big")
+    value = data[16:_BOX_HEADER.unpack_from(data)[0]]
+    if well_known_type == 1:
+        return value.decode("utf-8", "replace")
+    if well_known_type == 2:
+        return value.decode("utf-16-be", "replace")
+    if well_known_type in (21, 22) and len(value) in (1, 2, 4, 8):
+        return str(int.from_bytes(value, "big", signed=well_known_type == 21))
+    return None
+
+
+def _parse_meta_box(data, metadata):
+    """Collect the tags of a meta box payload (keys + ilst, or iTunes atoms) into metadata."""
+    # QuickTime meta boxes start with their children; ISO ones have version/flags first
+    pos = 0 if data[4:8] == b"hdlr" else 4
+    keys = []
+    items = []
+    while pos + 8 <= len(data):
+        size, box_type = _BOX_HEADER.unpack_from(data, pos)
+        if size < 8:
+            break
+        if box_type == b"keys":
+            # version/flags, entry count, then (size, namespace, name) entries
+            count = struct.unpack_from(">I", data, pos + 12)[0]
+            entry = pos + 16
+            for _ in range(count):
+                key_size = struct.unpack_from(">I", data, entry)[0]
+                keys.append(data[entry + 8:entry + key_size].decode("utf-8", "replace"))
+                entry += key_size
+        elif box_type == b"ilst":
+            items.append(data[pos + 8:pos + size])
+        pos += size
+
+    for ilst in items:
+        pos = 0
+        while pos + 8 <= len(ilst):
+            size, item_type = _BOX_HEADER.unpack_from(ilst, pos)
+            if size < 8:
+                break
+            value = _parse_data_box(ilst[pos + 8:pos + size])
+            if value is not None:
+                index = int.from_bytes(item_type, "big")
+                if keys and 0 < index <= len(keys):
+                    metadata[keys[index - 1]] = value
+                elif item_type in ITUNES_TAGS:
+                    metadata.setdefault(ITUNES_TAGS[item_type], value)
+            pos += size
+
+
+def read_mp4_metadata(path):
+    """
+    Read the container tags and frame size of an MP4/MOV without touching its media data.
+
+    Returns a (metadata, width, height, format) tuple. Tags written with
+    movflags=use_metadata_tags (ComfyUI's VIDEO.save_to and the MetaSaver
+    video nodes) are stored as mdta keys; iTunes-style atoms are mapped to
+    FFmpeg's tag names.
+
+    Args:
+        path: Path to the video file
+    """
+    metadata = {}
+    width = height = None
+    container = "MP4"
+    with open(path, "rb") as f:
+        end = os.fstat(f.fileno()).st_size
+        for box_type, start, box_end in _iter_boxes(f, 0, end):
+            if box_type == b"ftyp":
+                f.seek(start)
+                if f.read(4) == b"qt  ":
+                    container = "MOV"
+            elif box_type == b"moov":
+                for child, child_start, child_end in _iter_boxes(f, start, box_end):
+                    if child == b"meta":
+                        f.seek(child_start)
+                        _parse_meta_box(f.read(child_end - child_start), metadata)
+                    elif child == b"udta":
+                        for item, item_start, item_end in _iter_boxes(f, child_start, child_end):
+                            if item == b"meta":
+                                f.seek(item_start)
+                                _parse_meta_box(f.read(item_end - item_start), metadata)
+                    elif child == b"trak" and width is None:
+                        for item, item_start, item_end in _iter_boxes(f, child_start, child_end):
+                            if item == b"tkhd":
+                                f.seek(item_start)
+                                tkhd = f.read(item_end - item_start)
+                                # 16.16 fixed-point size after the version-dependent times
+                                offset = 88 if tkhd[0] == 1 else 76
+                                w, h = struct.unpack_from(">II", tkhd, offset)
+                                if w and h:
+                                    width, height = w >> 16, h >> 16
+                # Nothing after moov is needed
+                break
+    return metadata, width, height, container
+
+
+def _read_with_pillow(path):
+    from PIL import Image
+    from read_metadata import image_metadata
+
+    with Image.open(path) as img:
+        return image_metadata(img), img.width, img.height
+
+
+def scan_file(path, parse_json=False):
+    """
+    Return the scan record for one image.
+
+    The record has path, format, width, height, size and mtime keys plus
+    every metadata key found in the file. Failures are reported in an
+    "error" key instead of raising, so one bad file does not stop a scan.
+
+    Args:
+        path: Path to the PNG, WebP, JPEG or MP4/MOV file
+        parse_json: Decode JSON metadata values instead of keeping them as text
+    """
+    record = {"path": path}
+    try:
+        st = os.stat(path)
+        record["size"] = st.st_size
+        record["mtime"] = st.st_mtime
+        if path.lower().endswith(".png"):
+            record["format"] = "PNG"
+            metadata, record["width"], record["height"] = read_png_metadata(path)
+        elif path.lower().endswith(VIDEO_EXTENSIONS):
+            metadata, record["width"], record["height"], record["format"] = \
+                read_mp4_metadata(path)
+        else:
+            record["format"] = "JPEG" if path.lower().endswith((".jpg", ".jpeg")) else "WEBP"
+            metadata, record["width"], record["height"] = _read_with_pillow(path)
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+        return record
+
+    for key, value in metadata.items():
+        if key in record:
+            key = f"metadata.{key}"
+        if parse_json and isinstance(value, str):
+            try:
+                value = json.loads(value)
+            except json.JSONDecodeError:
+                pass
+        record[key] = value
+    return record
+
+
+def _scan_chunk(paths, parse_json):
+    return [scan_file(path, parse_json) for path in paths]
+
+
+def iter_images(roots, extensions=IMAGE_EXTENSIONS + VIDEO_EXTENSIONS):
+    """Yield image and video paths under the given files or directories, depth first."""
+    for root in roots:
+        if os.path.isfile(root):
+            yield root
+            continue
+        stack = [root]
+        while stack:
+            directory = stack.pop()
+            try:
+                entries = sorted(os.scandir(directory), key=lambda e: e.name)
+            except OSError as e:
+                print(f"Warning: cannot read {directory}: {e}", file=sys.stderr)
+                continue
+            subdirs = []
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    # Skip hidden folders such as MetaSaver's .metasaver_objects store
+                    if not entry.name.startswith("."):
+                        subdirs.append(entry.path)
+                elif entry.name.lower().endswith(extensions):
+                    yield entry.path
+            stack.extend(reversed(subdirs))
+
+
+def _batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def scan(paths, workers=None, chunk_size=256, parse_json=False):
+    """
+    Scan images and yield their records in input order.
+
+    Args:
+        paths: Iterable of image paths
+        workers: Worker processes; 0 scans in this process, None uses every CPU
+        chunk_size: Number of files handed to a worker at a time
+        parse_json: Decode JSON metadata values instead of keeping them as text
+    """
+    batches = _batched(paths, chunk_size)
+    if workers == 0:
+        for batch in batches:
+            yield from _scan_chunk(batch, parse_json)
+        return
+
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Keep a bounded number of batches in flight so huge trees are
+        # streamed instead of being listed up front
+        pending = []
+        for batch in batches:
+            pending.append(pool.submit(_scan_chunk, batch, parse_json))
+            if len(pending) >= workers * 2:
+                yield from pending.pop(0).result()
+        for future in pending:
+            yield from future.result()
+
+
+def write_jsonl(records, out):
+    count = 0
+    for record in records:
+        out.write(json.dumps(record, ensure_ascii=False))
+        out.write("\n")
+        count += 1
+    return count
+
+
+def write_csv(records, out, fields):
+    writer = csv.writer(out)
+    writer.writerow(fields + ["error"])
+    count = 0
+    for record in records:
+        row = []
+        for field in fields:
+            value = record.get(field, "")
+            if not isinstance(value, str):
+                value = json.dumps(value, ensure_ascii=False)
+            row.append(value)
+        row.append(record.get("error", ""))
+        writer.writerow(row)
+        count += 1
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk-scan MetaSaver image and video metadata")
+    parser.add_argument("paths", nargs="+", help="Image/video files or directories to scan")
+    parser.add_argument("--format", choices=["jsonl", "csv"], default="jsonl")
+    parser.add_argument("--fields", default=",".join(DEFAULT_CSV_FIELDS),
+                        help="Comma-separated CSV columns, e.g. path,meta_seed,prompt")
+    parser.add_argument("-o", "--output", help="Output file (default: stdout)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Worker processes (0 = scan in this process, default: all CPUs)")
+    parser.add_argument("--chunk-size", type=int, default=256,
+                        help="Files per worker task")
+    parser.add_argument("--parse-json", action="store_true",
+                        help="Decode JSON metadata values (JSONL output)")
+    args = parser.parse_args(argv)
+
+    records = scan(iter_images(args.paths), workers=args.workers,
+                   chunk_size=args.chunk_size, parse_json=args.parse_json)
+    out = open(args.output, "w", encoding="utf-8", newline="") if args.output else sys.stdout
+    try:
+        if args.format == "csv":
+            count = write_csv(records, out, [f.strip() for f in args.fields.split(",") if f.strip()])
+        else:
+            count = write_jsonl(records, out)
+    finally:
+        if args.output:
+            out.close()
+    print(f"Scanned {count} file(s)", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+"""
+Set custom metadata on existing videos without re-encoding them.
+
+The packets are stream-copied into a new container with the updated tags,
+so tagging a clip costs about as much as copying it. New fields are merged
+into the existing custom_metadata unless --replace is given.
+
+Usage:
+    python tag_video.py clip.mp4 --set seed=12345 --set model=sdxl
+    python tag_video.py output/video/*.mp4 --set reviewed=true --workers 8
+    python tag_video.py clip.mp4 --set rating=5 -o clip_tagged.mp4
+"""
+
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from video_remux import remux_metadata  # noqa: E402
+
+
+def parse_fields(assignments):
+    """Turn NAME=VALUE strings into a dict, decoding JSON values like 5 or true."""
+    fields = {}
+    for assignment in assignments:
+        name, sep, value = assignment.partition("=")
+        if not sep or not name.strip():
+            raise ValueError(f"Expected NAME=VALUE, got: {assignment}")
+        try:
+            fields[name.strip()] = json.loads(value)
+        except json.JSONDecodeError:
+            fields[name.strip()] = value
+    return fields
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Set custom metadata on videos without re-encoding")
+    parser.add_argument("videos", nargs="+", help="Video files to tag")
+    parser.add_argument("--set", dest="fields", action="append", default=[], metavar="NAME=VALUE",
+                        help="Custom field to set (repeatable)")
+    parser.add_argument("--replace", action="store_true",
+                        help="Drop existing custom fields instead of merging")
+    parser.add_argument("--field-prefix", default=None,
+                        help='Prefix of the per-field tags ("meta_", or "" for MetaVideoSaver'
+                             " files; default: the file's own)")
+    parser.add_argument("-o", "--output", help="Output file (single input only; default: in place)")
+    parser.add_argument("--workers", type=int, default=4, help="Files processed in parallel")
+    args = parser.parse_args(argv)
+
+    if args.output and len(args.videos) > 1:
+        parser.error("--output needs exactly one input video")
+    fields = parse_fields(args.fields)
+
+    def tag(path):
+        return remux_metadata(path, fields, args.output, replace=args.replace,
+                              field_prefix=args.field_prefix)
+
+    failed = 0
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        for path, future in [(path, pool.submit(tag, path)) for path in args.videos]:
+            try:
+                print(f"✅ {future.result()}")
+            except Exception as e:
+                failed += 1
+                print(f"Error tagging {path}: {e}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,201 @@
+"""
+Output filename allocation without per-save directory scans.
+
+folder_paths.get_save_image_path lists the whole output folder on every call
+to find the next "{prefix}_{counter:05}_" number, which grows with the folder
+and races when several ComfyUI processes share it. The allocator here keeps
+the next counter per (folder, prefix) in memory, seeds it with one scan the
+first time a prefix is used, and claims every name with an exclusive create
+(O_CREAT | O_EXCL). A name taken by another process or node in the meantime
+just makes the allocator move on to the next counter, so two writers never
+get the same file.
+"""
+
+import contextlib
+import logging
+import os
+import threading
+import time
+
+from .sharding import shard_folders, shard_subfolder
+
+logger = logging.getLogger(__name__)
+
+
+def compute_vars(text, image_width, image_height):
+    """Expand ComfyUI's %width%, %height% and %year%..%second% prefix variables."""
+    text = text.replace("%width%", str(image_width))
+    text = text.replace("%height%", str(image_height))
+    now = time.localtime()
+    text = text.replace("%year%", str(now.tm_year))
+    text = text.replace("%month%", str(now.tm_mon).zfill(2))
+    text = text.replace("%day%", str(now.tm_mday).zfill(2))
+    text = text.replace("%hour%", str(now.tm_hour).zfill(2))
+    text = text.replace("%minute%", str(now.tm_min).zfill(2))
+    text = text.replace("%second%", str(now.tm_sec).zfill(2))
+    return text
+
+
+def resolve_save_path(filename_prefix, output_dir, image_width=0, image_height=0):
+    """
+    Split a filename prefix into its output folder and base name.
+
+    Mirrors folder_paths.get_save_image_path without the counter scan and
+    returns (full_output_folder, filename, subfolder, filename_prefix).
+
+    Args:
+        filename_prefix: Prefix from the node, may contain subfolders and %vars%
+        output_dir: ComfyUI output directory
+        image_width: Value for %width%
+        image_height: Value for %height%
+    """
+    if "%" in filename_prefix:
+        filename_prefix = compute_vars(filename_prefix, image_width, image_height)
+
+    subfolder = os.path.dirname(os.path.normpath(filename_prefix))
+    filename = os.path.basename(os.path.normpath(filename_prefix))
+    full_output_folder = os.path.join(output_dir, subfolder)
+
+    output_dir = os.path.abspath(output_dir)
+    common = os.path.commonpath((output_dir, os.path.abspath(full_output_folder)))
+    if common != output_dir:
+        err = "**** ERROR: Saving image outside the output folder is not allowed." + \
+              "\n full_output_folder: " + os.path.abspath(full_output_folder) + \
+              "\n         output_dir: " + output_dir + \
+              "\n         commonpath: " + common
+        logger.error(err)
+        raise Exception(err)
+
+    return full_output_folder, filename, subfolder, filename_prefix
+
+
+def scan_next_counter(folder, filename):
+    """Return the counter after the highest "{filename}_NNNNN_" entry in folder."""
+    prefix = os.path.normcase(filename) + "_"
+    highest = 0
+    try:
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                name = os.path.normcase(entry.name)
+                if not name.startswith(prefix):
+                    continue
+                digits, sep, _ = name[len(prefix):].partition("_")
+                if sep and digits.isdigit():
+                    highest = max(highest, int(digits))
+    except FileNotFoundError:
+        pass
+    return highest + 1
+
+
+def seed_counter(folder, filename):
+    """
+    Return the first free counter for a prefix, looking into shard folders too.
+
+    Shards of every layout are checked so switching shard_layout never reuses
+    a counter. The counter layout keeps the newest files in its highest shard,
+    so only that one is listed; hash shards all have to be listed once.
+    """
+    counter = scan_next_counter(folder, filename)
+    shards = shard_folders(folder, "counter")[-1:] + shard_folders(folder, "hash")
+    for shard in shards:
+        counter = max(counter, scan_next_counter(shard, filename))
+    return counter
+
+
+@contextlib.contextmanager
+def removed_on_error(path):
+    """
+    Remove path if the enclosed block raises.
+
+    Every write to a reserved name goes through this, so a failed save leaves
+    neither a truncated file nor an empty reserved name behind.
+    """
+    try:
+        yield
+    except BaseException:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def release_unwritten(paths):
+    """
+    Remove the reserved names among paths that were never written.
+
+    A reserved name stays an empty file until its image is written, and no
+    written image is empty, so after a failed batch only the zero-byte
+    placeholders are removed; images that were saved before the failure are
+    kept.
+    """
+    for path in paths:
+        try:
+            if os.path.getsize(path) == 0:
+                os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+class FilenameAllocator:
+    """Hands out "{filename}_{counter:05}_.{extension}" names, one claim per name."""
+
+    def __init__(self):
+        self._next = {}
+        self._lock = threading.Lock()
+
+    def reserve(self, folder, filename, extension, count=1, layout="off", shard_size=1000):
+        """
+        Claim count new file names and return them as (counter, file, shard) tuples.
+
+        shard is the file's folder relative to folder ("" without sharding).
+        Each returned name exists as an empty file owned by the caller, which is
+        expected to overwrite it (or remove it if the save fails).
+
+        Args:
+            folder: Full output folder
+            filename: Base filename from the prefix
+            extension: File extension without the dot
+            count: Number of names to claim
+            layout: Shard layout, one of sharding.SHARD_LAYOUTS
+            shard_size: Counters per folder for the counter layout
+        """
+        key = (os.path.normcase(os.path.abspath(folder)), os.path.normcase(filename))
+        reserved = []
+        with self._lock:
+            counter = self._next.get(key)
+            if counter is None:
+                os.makedirs(folder, exist_ok=True)
+                counter = seed_counter(folder, filename)
+            while len(reserved) < count:
+                file = f"{filename}_{counter:05}_.{extension}"
+                shard = shard_subfolder(layout, filename, counter, shard_size)
+                try:
+                    fd = os.open(os.path.join(folder, shard, file),
+                                 os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                except FileExistsError:
+                    # Taken by another process or node since the scan
+                    counter += 1
+                    continue
+                except FileNotFoundError:
+                    # New shard, or the folder was removed after the counter was cached
+                    os.makedirs(os.path.join(folder, shard), exist_ok=True)
+                    continue
+                os.close(fd)
+                reserved.append((counter, file, shard))
+                counter += 1
+            self._next[key] = counter
+        return reserved
+
+    def clear(self):
+        """Forget all cached counters; the next reserve() rescans its folder."""
+        with self._lock:
+            self._next.clear()
+
+
+_allocator = FilenameAllocator()
+
+
+def reserve_filenames(folder, filename, extension, count=1, layout="off", shard_size=1000):
+    """Claim count names from the shared allocator (see FilenameAllocator.reserve)."""
+    return _allocator.reserve(folder, filename, extension, count, layout, shard_size)
@@ -0,0 +1,193 @@
+"""
+Bounded conversion of arbitrary node inputs into JSON-friendly metadata values.
+
+Anything can be wired into a meta_value_i socket, including tensors, latents,
+conditioning and large arrays. format_value keeps scalars and small
+containers as they are, but summarizes tensors and arrays (shape, dtype and
+min/max/mean/std from at most SAMPLE_ELEMENTS elements) instead of printing
+them. It also caps nesting depth, container length and the total size of a
+field, so a field costs roughly the same to serialize whatever is connected.
+
+Set METASAVER_HASH_VALUES=1 to add a blake2b hash of the full data to tensor
+and array summaries (this reads every element).
+"""
+
+import hashlib
+import math
+import os
+
+MAX_DEPTH = 6
+MAX_ITEMS = 100
+MAX_FIELD_BYTES = 64 * 1024
+# Arrays with at most this many elements are stored as plain lists
+INLINE_ELEMENTS = 16
+SAMPLE_ELEMENTS = 1 << 16
+
+
+class _Budget:
+    """Remaining serialized size of one field, shared by all of its parts."""
+
+    def __init__(self, size):
+        self.remaining = size
+
+    def take(self, size):
+        self.remaining -= size
+        return self.remaining >= 0
+
+
+def _is_array(value):
+    return hasattr(value, "shape") and hasattr(value, "dtype") and not isinstance(value, type)
+
+
+def _float(value):
+    value = float(value)
+    return value if math.isfinite(value) else str(value)
+
+
+def _is_contiguous(value):
+    if hasattr(value, "is_contiguous"):
+        return value.is_contiguous()
+    flags = getattr(value, "flags", None)
+    return flags is not None and flags["C_CONTIGUOUS"]
+
+
+def _strided_sample(value, shape, count):
+    """
+    Return a strided view of at most SAMPLE_ELEMENTS elements of an array.
+
+    Contiguous inputs are sampled through a flat view. Other inputs would be
+    copied whole by a reshape, so every dimension is sliced with its own step
+    instead, spreading the element budget over the dimensions.
+    """
+    if count <= SAMPLE_ELEMENTS:
+        return value
+    if _is_contiguous(value):
+        return value.reshape(-1)[::-(-count // SAMPLE_ELEMENTS)]
+    budget = SAMPLE_ELEMENTS
+    index = []
+    for dim, size in enumerate(shape):
+        inner = math.prod(shape[dim + 1:])
+        if inner <= budget:
+            # The remaining dimensions fit whole; thin out this one and stop
+            index.append(slice(None, None, -(-size // max(1, budget // inner))))
+            break
+        keep = max(1, int(budget ** (1 / (len(shape) - dim))))
+        step = -(-size // keep)
+        index.append(slice(None, None, step))
+        budget //= -(-size // step)
+    return value[tuple(index)]
+
+
+def _array_summary(value):
+    is_tensor = hasattr(value, "detach")
+    shape = [int(n) for n in value.shape]
+    summary = {
+        "type": "tensor" if is_tensor else "ndarray",
+        "shape": shape,
+        "dtype": str(value.dtype).replace("torch.", ""),
+    }
+    if is_tensor:
+        summary["device"] = str(value.device)
+
+    count = math.prod(shape)
+    if count:
+        try:
+            # Statistics over a strided sample keep the cost independent of the size
+            sample = _strided_sample(value, shape, count)
+            if is_tensor:
+                sample = sample.detach().float()
+                sampled = sample.numel()
+                stats = (sample.min(), sample.max(), sample.mean(),
+                         sample.std() if sampled > 1 else 0.0)
+            else:
+                sample = sample.astype("float64")
+                sampled = sample.size
+                stats = (sample.min(), sample.max(), sample.mean(), sample.std())
+            for name, stat in zip(("min", "max", "mean", "std"), stats):
+                summary[name] = _float(stat)
+            if sampled < count:
+                summary["sampled"] = sampled
+        except (TypeError, ValueError, RuntimeError):
+            # Non-numeric dtypes have no statistics
+            pass
+
+    if os.environ.get("METASAVER_HASH_VALUES") == "1":
+        try:
+            data = value.detach().cpu().contiguous().numpy() if is_tensor else value
+            summary["blake2b"] = hashlib.blake2b(data.tobytes(), digest_size=16).hexdigest()
+        except (TypeError, RuntimeError):
+            # e.g. bfloat16 tensors, which numpy cannot represent
+            pass
+    return summary
+
+
+def _format(value, depth, budget):
+    if value is None or isinstance(value, (bool, int)):
+        budget.take(8)
+        return value
+    if isinstance(value, float):
+        budget.take(24)
+        return value
+    if isinstance(value, str):
+        if not budget.take(len(value) + 2):
+            keep = max(0, len(value) + budget.remaining - 16)
+            return value[:keep] + "...[truncated]"
+        return value
+    if isinstance(value, bytes):
+        return _format(f"<{len(value)} bytes>", depth, budget)
+
+    if _is_array(value):
+        size = getattr(value, "size", None)
+        count = value.numel() if hasattr(value, "numel") else size
+        if count == 1 and hasattr(value, "item"):
+            # numpy scalars and single-element tensors
+            return _format(value.item(), depth, budget)
+        if count is not None and count <= INLINE_ELEMENTS and hasattr(value, "tolist"):
+            return _format(value.tolist(), depth, budget)
+        budget.take(200)
+        return _array_summary(value)
+
+    if isinstance(value, dict):
+        if depth >= MAX_DEPTH:
+            return _format(f"<dict of {len(value)} items>", depth, budget)
+        result = {}
+        for n, (key, item) in enumerate(value.items()):
+            if n >= MAX_ITEMS or budget.remaining <= 0:
+                result["..."] = f"{len(value) - n} more items"
+                break
+            key = str(key)
+            budget.take(len(key) + 4)
+            result[key] = _format(item, depth + 1, budget)
+        return result
+
+    if isinstance(value, (list, tuple, set, frozenset)):
+        if depth >= MAX_DEPTH:
+            return _format(f"<{type(value).__name__} of {len(value)} items>", depth, budget)
+        result = []
+        for n, item in enumerate(value):
+            if n >= MAX_ITEMS or budget.remaining <= 0:
+                result.append(f"... {len(value) - n} more items")
+                break
+            budget.take(2)
+            result.append(_format(item, depth + 1, budget))
+        return result
+
+    if hasattr(value, "item"):
+        try:
+            return _format(value.item(), depth, budget)
+        except (TypeError, ValueError, RuntimeError):
+            pass
+
+    # Convert to string as fallback
+    return _format(str(value), depth, budget)
+
+
+def format_value(value, max_bytes=MAX_FIELD_BYTES):
+    """
+    Format a metadata value for JSON serialization, bounded in size and cost.
+
+    Args:
+        value: Anything connected to a meta_value_i input
+        max_bytes: Approximate maximum serialized size of the field
+    """
+    return _format(value, 0, _Budget(max_bytes))
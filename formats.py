@@ -0,0 +1,107 @@
+"""
+Output format engines for the image saver nodes.
+
+Each engine knows how to turn the node's metadata entries into the container
+its format uses and how to encode a PIL image with per-format settings:
+
+- png:  text chunks (see png_metadata)
+- webp: EXIF, lossless by default
+- jpeg: EXIF
+
+For WebP and JPEG the workflow is stored the way ComfyUI's own WebP saver does
+it ("prompt:<json>" in the Model tag, "<key>:<json>" in Make and downwards) so
+the frontend can still load it, and custom_metadata goes in the EXIF
+UserComment. The individual per-field entries only exist as PNG text chunks.
+"""
+
+import logging
+
+from PIL import Image
+
+from .png_metadata import ascii_json, build_pnginfo
+
+logger = logging.getLogger(__name__)
+
+EXIF_IFD = 0x8769
+EXIF_USER_COMMENT = 0x9286
+EXIF_MODEL = 0x0110
+EXIF_MAKE = 0x010F
+
+# A JPEG APP1 segment holds at most 65535 bytes including its header
+JPEG_MAX_EXIF = 65533
+
+class PNGEngine:
+    name = "png"
+    extension = "png"
+
+    def build_metadata(self, entries, zip_threshold=None):
+        return build_pnginfo(entries, zip_threshold)
+
+    def save(self, img, path, metadata, options):
+        img.save(path, format="PNG", pnginfo=metadata,
+                 compress_level=options.get("compress_level", 4))
+
+
+class _ExifEngine:
+    def build_metadata(self, entries, zip_threshold=None):
+        return self._build_exif(entries, include_workflow=True)
+
+    def _build_exif(self, entries, include_workflow):
+        exif = Image.Exif()
+        tag = EXIF_MAKE
+        for key, text, compressible in entries:
+            if key == "custom_metadata":
+                exif.get_ifd(EXIF_IFD)[EXIF_USER_COMMENT] = \
+                    b"UNICODE\0" + text.encode("utf-16-le")
+            elif not compressible or not include_workflow:
+                continue
+            elif key == "prompt":
+                exif[EXIF_MODEL] = f"prompt:{ascii_json(text)}"
+            else:
+                exif[tag] = f"{key}:{ascii_json(text)}"
+                tag -= 1
+        return exif.tobytes()
+
+
+class WebPEngine(_ExifEngine):
+    name = "webp"
+    extension = "webp"
+
+    def save(self, img, path, metadata, options):
+        img.save(path, format="WEBP", exif=metadata,
+                 lossless=options.get("lossless", True),
+                 quality=options.get("quality", 90),
+                 method=options.get("effort", 4))
+
+
+class JPEGEngine(_ExifEngine):
+    name = "jpeg"
+    extension = "jpg"
+
+    def build_metadata(self, entries, zip_threshold=None):
+        entries = list(entries)
+        exif = self._build_exif(entries, include_workflow=True)
+        if len(exif) > JPEG_MAX_EXIF:
+            logger.warning("MetaSaver: workflow metadata (%d bytes) does not fit in a JPEG "
+                           "EXIF segment; saving custom_metadata only", len(exif))
+            exif = self._build_exif(entries, include_workflow=False)
+        return exif
+
+    def save(self, img, path, metadata, options):
+        img.save(path, format="JPEG", exif=metadata,
+                 quality=options.get("quality", 90))
+
+
+FORMAT_ENGINES = {
+    "png": PNGEngine(),
+    "webp": WebPEngine(),
+    "jpeg": JPEGEngine(),
+}
+
+
+def get_engine(name):
+    """Look up a format engine by name."""
+    try:
+        return FORMAT_ENGINES[name]
+    except KeyError:
+        raise ValueError(f"Unknown image format: {name}") from None
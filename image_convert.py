@@ -0,0 +1,30 @@
+"""
+Conversion of ComfyUI IMAGE batches to uint8 pixel buffers.
+"""
+
+import numpy as np
+
+
+def quantize_batch(images):
+    """
+    Convert a whole IMAGE batch to uint8 in one pass.
+
+    Scaling, clamping and the uint8 cast happen on the tensor's own device, so
+    only the uint8 result crosses to the host, in a single contiguous transfer.
+    Indexing the returned array gives zero-copy per-image views.
+
+    Args:
+        images: IMAGE tensor [B, H, W, C] with values in 0..1 (numpy arrays also work)
+
+    Returns:
+        C-contiguous numpy uint8 array [B, H, W, C]
+    """
+    if hasattr(images, "byte"):
+        # torch tensor: quantize in place on a single scaled copy, then transfer
+        quantized = images.mul(255.).clamp_(0, 255).byte().contiguous()
+        return quantized.cpu().numpy()
+
+    array = images.cpu().numpy() if hasattr(images, "cpu") else np.asarray(images)
+    scaled = np.multiply(array, 255., dtype=np.float32)
+    np.clip(scaled, 0, 255, out=scaled)
+    return np.ascontiguousarray(scaled.astype(np.uint8))
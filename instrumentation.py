@@ -0,0 +1,224 @@
+"""
+Hot-path instrumentation for the saver nodes.
+
+A SaveStats object collects per-stage timings, bytes written and, optionally,
+the tracemalloc peak of one node call. Finished stats are logged as a
+structured record on the "metasaver.stats" logger, can be returned in the
+node's ui dict, and are aggregated into a Prometheus text-format file when
+the METASAVER_METRICS_FILE environment variable is set (rewritten at most
+every METASAVER_METRICS_INTERVAL seconds, default 15).
+
+With instrumentation off the nodes use NULL_STATS, whose methods do nothing.
+
+tracemalloc is process-wide and keeps a single peak, so the peak is only
+reported for saves that did not overlap another memory-traced save (async
+saves and thread executors can run several at once). Tracing starts with
+the first traced save and stops when the last one finishes.
+"""
+
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+
+logger = logging.getLogger("metasaver.stats")
+
+INSTRUMENTATION_MODES = ["off", "log", "log+ui"]
+
+
+class _MemoryTracing:
+    """Shares tracemalloc between the memory-traced saves running at the same time."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active = set()
+        self._overlapped = set()
+        self._started = False
+
+    def begin(self, token):
+        with self._lock:
+            if self._active:
+                # The single process-wide peak now covers several saves
+                self._overlapped.update(self._active)
+                self._overlapped.add(token)
+            else:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                    self._started = True
+                tracemalloc.reset_peak()
+            self._active.add(token)
+
+    def end(self, token):
+        """Stop tracking a save and return its peak, or None if it overlapped another."""
+        with self._lock:
+            if token not in self._active:
+                return None
+            self._active.discard(token)
+            peak = None
+            if token in self._overlapped:
+                self._overlapped.discard(token)
+            elif tracemalloc.is_tracing():
+                peak = tracemalloc.get_traced_memory()[1]
+            if not self._active and self._started:
+                tracemalloc.stop()
+                self._started = False
+            return peak
+
+
+_memory_tracing = _MemoryTracing()
+
+
+class SaveStats:
+    """Timings and counters for a single save call."""
+
+    enabled = True
+
+    def __init__(self, node, trace_memory=False):
+        self.node = node
+        self.stages = {}
+        self.bytes_written = 0
+        self.files = 0
+        self.peak_memory = None
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+        self._traced = trace_memory
+        if trace_memory:
+            _memory_tracing.begin(self)
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Time the enclosed block and add it to the named stage."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def add_time(self, name, seconds):
+        """Add seconds to a stage; safe to call from worker threads."""
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def add_file(self, nbytes):
+        with self._lock:
+            self.bytes_written += nbytes
+            self.files += 1
+
+    def as_record(self):
+        """Return the stats collected so far as a JSON-serializable dict."""
+        with self._lock:
+            record = {
+                "node": self.node,
+                "total_s": round(time.perf_counter() - self._start, 6),
+                "stages_s": {name: round(seconds, 6) for name, seconds in self.stages.items()},
+                "files": self.files,
+                "bytes_written": self.bytes_written,
+            }
+        if self.peak_memory is not None:
+            record["peak_traced_bytes"] = self.peak_memory
+        return record
+
+    def finish(self):
+        """Stop the clock, publish the stats and return them as a dict."""
+        if self._traced:
+            self._traced = False
+            self.peak_memory = _memory_tracing.end(self)
+        record = self.as_record()
+        logger.info("MetaSaver save stats: %s", json.dumps(record),
+                    extra={"metasaver_stats": record})
+        _metrics.record(record)
+        return record
+
+
+class _NullStats:
+    """Stand-in used when instrumentation is off."""
+
+    enabled = False
+    _null_context = contextlib.nullcontext()
+
+    def stage(self, name):
+        return self._null_context
+
+    def add_time(self, name, seconds):
+        pass
+
+    def add_file(self, nbytes):
+        pass
+
+    def as_record(self):
+        return None
+
+    def finish(self):
+        return None
+
+
+NULL_STATS = _NullStats()
+
+
+def start_stats(node, mode="off", trace_memory=False):
+    """Return a SaveStats for the given instrumentation mode, or NULL_STATS when off."""
+    if mode == "off":
+        return NULL_STATS
+    return SaveStats(node, trace_memory=trace_memory)
+
+
+class PrometheusTextfile:
+    """Cumulative save metrics rewritten periodically in Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._last_write = 0.0
+
+    def record(self, record):
+        path = os.environ.get("METASAVER_METRICS_FILE")
+        if not path:
+            return
+        node = record["node"]
+        with self._lock:
+            self._inc("metasaver_saves_total", node, None, 1)
+            self._inc("metasaver_files_total", node, None, record["files"])
+            self._inc("metasaver_bytes_written_total", node, None, record["bytes_written"])
+            self._inc("metasaver_save_seconds_total", node, None, record["total_s"])
+            for stage, seconds in record["stages_s"].items():
+                self._inc("metasaver_stage_seconds_total", node, stage, seconds)
+
+            interval = float(os.environ.get("METASAVER_METRICS_INTERVAL", "15"))
+            now = time.monotonic()
+            if now - self._last_write < interval:
+                return
+            self._last_write = now
+
+            # Write atomically so the node exporter never reads a partial file
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            try:
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    f.write(self._render())
+                os.replace(tmp_path, path)
+            except OSError as e:
+                logger.warning("MetaSaver: could not write metrics file %s: %s", path, e)
+
+    def _inc(self, name, node, stage, value):
+        key = (name, node, stage)
+        self._counters[key] = self._counters.get(key, 0) + value
+
+    def _render(self):
+        lines = []
+        seen = set()
+        for (name, node, stage), value in sorted(self._counters.items(),
+                                                 key=lambda item: (item[0][0], item[0][1],
+                                                                   item[0][2] or "")):
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# TYPE {name} counter")
+            labels = f'node="{node}"'
+            if stage is not None:
+                labels += f',stage="{stage}"'
+            lines.append(f"{name}{{{labels}}} {value}")
+        return "\n".join(lines) + "\n"
+
+
+_metrics = PrometheusTextfile()
@@ -1,10 +1,32 @@
-import os
+import contextlib
+import functools
+import hashlib
 import json
-import numpy as np
-from PIL import Image, PngImagePlugin
-from PIL.PngImagePlugin import PngInfo
+import os
+import time
 import folder_paths
 
+from .adaptive_compression import AdaptiveCompression
+from .animated_output import MULTI_FRAME_FORMATS, frame_metadata, multi_frame_batch
+from .archive_output import archive_batch, get_archive_writer
+from .filename_allocator import (release_unwritten, removed_on_error, reserve_filenames,
+                                 resolve_save_path)
+from .format_value import format_value
+from .formats import FORMAT_ENGINES, get_engine
+from .image_convert import quantize_batch
+from .instrumentation import INSTRUMENTATION_MODES, start_stats
+from .metadata_index import default_index_path, get_index
+from .object_store import (SIDECAR_KEYS, batch_digest, content_digest, get_object_store,
+                           publish_outputs)
+from .parallel_deflate import parallel_stream_batch
+from .parallel_encode import EXECUTOR_MODES, encode_batch
+from .png_metadata import dumps_json
+from .png_stream import stream_batch
+from .preview import PREVIEW_FORMATS, write_previews
+from .save_queue import get_save_queue, raise_background_errors
+from .sharding import OUTPUT_NAME, SHARD_LAYOUTS
+from .video_remux import existing_custom_metadata, probe_video, remux_metadata
+from .video_stream import VIDEO_CODECS, X264_PRESETS, encode_images
 
 
 class AnyType(str):
@@ -21,6 +43,417 @@ class AnyType(str):
 ANY = AnyType("*")
 
 
+# Save settings shared by the image saver nodes. They are appended after the
+# meta_name_i/meta_value_i pairs so saved workflows keep their widget values.
+#
+# async_save:             Encode and write in the background, returning immediately
+# executor:               Encode batch items sequentially or on a thread/process pool
+# encode_workers:         Pool size for the threads/processes executors (0 = CPU count)
+# compress_metadata:      Store large workflow/metadata JSON as zlib-compressed chunks
+# metadata_zip_threshold: Minimum text length (characters) to compress
+# format:                 Output format (png, webp, jpeg)
+# quality:                JPEG quality, and WebP quality when not lossless
+# lossless:               Use lossless WebP
+# effort:                 WebP encoder effort (0 = fastest, 6 = smallest)
+# compress_level:         PNG zlib level (0-9)
+# adaptive_compression:   Pick the PNG zlib level from measured save latency
+# adaptive_min_level:     Lowest level adaptive mode may use
+# adaptive_max_level:     Highest level adaptive mode may use
+# adaptive_target_ms:     Target encode+write time per batch for adaptive mode
+# instrumentation:        Log per-stage timings ("log"), and also return them in the ui dict ("log+ui")
+# trace_memory:           Include the tracemalloc peak in the instrumentation stats
+# index_metadata:         Record each saved file in the SQLite metadata index
+# shard_layout:           Spread files over nested subfolders by counter range or name hash
+# shard_size:             Files per subfolder for the counter layout
+# dedup:                  Hard-link images identical to an earlier output instead of re-encoding
+# workflow_sidecar:       Store prompt/workflow JSON once in the object store, embed only its hash
+# stream_threshold_mp:    Stream PNGs of at least this many megapixels strip by strip (0 = never)
+# deflate_threads:        Threads compressing each PNG in parallel blocks (1 = off, 0 = CPU count)
+# preview_size:           Show downscaled previews of at most this many pixels per side in the UI (0 = full files)
+# preview_format:         Format of the preview files written to the temp directory
+# archive_shard_mb:       Append images to rolling tar shards of this size with a JSONL manifest (0 = files)
+# multi_frame:            Save the whole batch as one APNG (png) or animated WebP (webp) file
+# frame_duration_ms:      Display time of each frame in multi-frame files
+IMAGE_SAVE_OPTIONS = {
+    "async_save": ("BOOLEAN", {"default": False}),
+    "executor": (EXECUTOR_MODES, {"default": "sequential"}),
+    "encode_workers": ("INT", {"default": 0, "min": 0, "max": 256}),
+    "compress_metadata": ("BOOLEAN", {"default": False}),
+    "metadata_zip_threshold": ("INT", {"default": 4096, "min": 0, "max": 1 << 30}),
+    "format": (list(FORMAT_ENGINES), {"default": "png"}),
+    "quality": ("INT", {"default": 90, "min": 1, "max": 100}),
+    "lossless": ("BOOLEAN", {"default": True}),
+    "effort": ("INT", {"default": 4, "min": 0, "max": 6}),
+    "compress_level": ("INT", {"default": 4, "min": 0, "max": 9}),
+    "adaptive_compression": ("BOOLEAN", {"default": False}),
+    "adaptive_min_level": ("INT", {"default": 1, "min": 0, "max": 9}),
+    "adaptive_max_level": ("INT", {"default": 9, "min": 0, "max": 9}),
+    "adaptive_target_ms": ("INT", {"default": 500, "min": 1, "max": 600000}),
+    "instrumentation": (INSTRUMENTATION_MODES, {"default": "off"}),
+    "trace_memory": ("BOOLEAN", {"default": False}),
+    "index_metadata": ("BOOLEAN", {"default": False}),
+    "shard_layout": (SHARD_LAYOUTS, {"default": "off"}),
+    "shard_size": ("INT", {"default": 1000, "min": 1, "max": 1 << 20}),
+    "dedup": ("BOOLEAN", {"default": False}),
+    "workflow_sidecar": ("BOOLEAN", {"default": False}),
+    "stream_threshold_mp": ("INT", {"default": 32, "min": 0, "max": 4096}),
+    "deflate_threads": ("INT", {"default": 1, "min": 0, "max": 256}),
+    "preview_size": ("INT", {"default": 0, "min": 0, "max": 8192}),
+    "preview_format": (PREVIEW_FORMATS, {"default": "webp"}),
+    "archive_shard_mb": ("INT", {"default": 0, "min": 0, "max": 1 << 20}),
+    "multi_frame": ("BOOLEAN", {"default": False}),
+    "frame_duration_ms": ("INT", {"default": 100, "min": 1, "max": 60000}),
+}
+
+
+# Per-field tag prefix choices of the remux node; "auto" detects the file's own
+REMUX_FIELD_PREFIXES = {"auto": None, "meta_": "meta_", "none": ""}
+
+
+# Instrumentation, index and layout settings of the video saver nodes (see IMAGE_SAVE_OPTIONS)
+VIDEO_SAVE_OPTIONS = {
+    "instrumentation": IMAGE_SAVE_OPTIONS["instrumentation"],
+    "trace_memory": IMAGE_SAVE_OPTIONS["trace_memory"],
+    "index_metadata": IMAGE_SAVE_OPTIONS["index_metadata"],
+    "shard_layout": IMAGE_SAVE_OPTIONS["shard_layout"],
+    "shard_size": IMAGE_SAVE_OPTIONS["shard_size"],
+}
+
+
+def _image_save_options(kwargs):
+    """Resolve the shared save settings from node kwargs, filling in defaults."""
+    return {name: kwargs.get(name, spec[1]["default"])
+            for name, spec in IMAGE_SAVE_OPTIONS.items()}
+
+
+def _index_video(node, file, subfolder, counter, width, height, ext, prompt_text,
+                 custom_metadata):
+    """
+    Record one written video in the metadata index.
+
+    Args:
+        node: The saver node
+        file: File name of the video
+        subfolder: Subfolder of the file in the output directory
+        counter: Filename counter, or None
+        width: Frame width
+        height: Frame height
+        ext: Container extension, stored as the format
+        prompt_text: Prompt JSON as serialized by dumps_json, or None
+        custom_metadata: The custom fields
+    """
+    index = get_index(default_index_path(node.output_dir))
+    index.add([{
+        "path": os.path.join(subfolder, file),
+        "subfolder": subfolder,
+        "filename": file,
+        "counter": counter,
+        "width": width,
+        "height": height,
+        "format": ext,
+        "node": type(node).__name__,
+        "prompt_text": prompt_text,
+        "custom_metadata": custom_metadata,
+    }])
+
+
+def _encode_measured(controller, nbytes, encode, pixels, items, engine, options, executor, workers,
+                     stats):
+    """Encode a batch and report its latency and raw pixel bytes to the compression controller."""
+    start = time.perf_counter()
+    encode(pixels, items, engine, options, executor, workers, stats)
+    controller.record(options["compress_level"], time.perf_counter() - start, nbytes)
+
+
+def _run_batch(job, args, stats, on_success=(), reserved=()):
+    """
+    Run an encode job, then run the success hooks in order and publish the stats.
+
+    If the job or a hook fails, the reserved names that were not written yet
+    are removed before the error propagates.
+    """
+    try:
+        if job is not None:
+            job(*args)
+        for hook in on_success:
+            hook()
+    except BaseException:
+        release_unwritten(reserved)
+        raise
+    finally:
+        record = stats.finish()
+    return record
+
+
+def _save_image_batch(node, images, filename_prefix, entries, custom_metadata, options, stats):
+    """
+    Shared save path of the image nodes: quantize, name, encode and write a batch.
+
+    Failures of earlier background saves are raised only once this batch has
+    been written or queued, so one failed save never drops the next batch.
+
+    Args:
+        node: The calling node (output_dir, type, prefix_append, compression)
+        images: Tensor of images to save
+        filename_prefix: Prefix for saved filenames
+        entries: Metadata as (key, text, compressible) tuples, in chunk order
+        custom_metadata: The custom fields, for the metadata index
+        options: Save settings from _image_save_options
+        stats: SaveStats for this call (NULL_STATS when instrumentation is off)
+    """
+    result = _write_image_batch(node, images, filename_prefix, entries, custom_metadata,
+                                options, stats)
+    raise_background_errors()
+    return result
+
+
+def _write_image_batch(node, images, filename_prefix, entries, custom_metadata, options, stats):
+    """Body of _save_image_batch (same arguments), without the report of earlier failures."""
+    prompt_text = next((text for key, text, _ in entries if key == "prompt"), None)
+    # Archive shards take one encoded file per image, so multi-frame only applies to files
+    multi_frame = options["multi_frame"] and options["archive_shard_mb"] == 0
+    if multi_frame:
+        if options["format"] not in MULTI_FRAME_FORMATS:
+            raise ValueError(f"multi_frame needs the png or webp format, not {options['format']}")
+        # The metadata goes in the file once; per-frame values become a frame-indexed list
+        custom_metadata = frame_metadata(custom_metadata, len(images))
+        entries = [(key, dumps_json(custom_metadata), compressible) if key == "custom_metadata"
+                   else (key, text, compressible) for key, text, compressible in entries]
+    if options["workflow_sidecar"]:
+        with stats.stage("metadata"):
+            store = get_object_store(node.output_dir)
+            entries = [(f"{key}_ref", store.store_text(text), True) if key in SIDECAR_KEYS
+                       else (key, text, compressible) for key, text, compressible in entries]
+
+    filename_prefix += node.prefix_append
+    with stats.stage("paths"):
+        full_output_folder, filename, subfolder, filename_prefix = \
+            resolve_save_path(filename_prefix, node.output_dir,
+                              images[0].shape[1], images[0].shape[0])
+
+    results = list()
+    save_queue = get_save_queue() if options["async_save"] else None
+
+    # Prepare the metadata container once for the whole batch
+    with stats.stage("metadata"):
+        zip_threshold = options["metadata_zip_threshold"] if options["compress_metadata"] else None
+        engine = get_engine(options["format"])
+        metadata = engine.build_metadata(entries, zip_threshold)
+
+    # Very large PNGs are quantized, filtered and compressed strip by strip
+    # straight from the tensor instead of as whole-image copies
+    height, width = images.shape[1], images.shape[2]
+    frame_bytes = height * width * images.shape[3]
+    threshold = options["stream_threshold_mp"]
+    # Archive shards take encoded bytes, which needs the quantized batch
+    archive = options["archive_shard_mb"] > 0
+    single = archive or multi_frame
+    streaming = (engine.name == "png" and not single and threshold > 0
+                 and width * height >= threshold * 1000000)
+    # Parallel deflate splits each PNG into blocks of rows, so it streams as well
+    parallel_deflate = engine.name == "png" and not single and options["deflate_threads"] != 1
+
+    if multi_frame and engine.name == "png":
+        # APNG frames are quantized one at a time
+        streaming = True
+        pixels = images
+        encode = multi_frame_batch
+    elif parallel_deflate:
+        streaming = True
+        pixels = images
+        encode = parallel_stream_batch
+    elif streaming:
+        pixels = images
+        encode = stream_batch
+    else:
+        # Quantize the whole batch on-device and transfer it to the host once
+        with stats.stage("convert"):
+            pixels = quantize_batch(images)
+        encode = multi_frame_batch if multi_frame else encode_batch
+
+    compress_level = options["compress_level"]
+    adaptive = options["adaptive_compression"] and engine.name == "png"
+    if adaptive:
+        queue_depth = save_queue.pending() if save_queue is not None else 0
+        compress_level = node.compression.choose(options["adaptive_min_level"],
+                                                 options["adaptive_max_level"],
+                                                 options["adaptive_target_ms"],
+                                                 frame_bytes * len(images), queue_depth)
+
+    encoder_options = {
+        "compress_level": compress_level,
+        "quality": options["quality"],
+        "lossless": options["lossless"],
+        "effort": options["effort"],
+    }
+    if parallel_deflate:
+        encoder_options["deflate_threads"] = options["deflate_threads"]
+    if multi_frame:
+        encoder_options["frame_duration_ms"] = options["frame_duration_ms"]
+
+    if archive:
+        return _save_archive_batch(node, pixels, engine, metadata, encoder_options, filename,
+                                   full_output_folder, prompt_text, custom_metadata, options,
+                                   save_queue, stats)
+
+    # Claim one name per image up front; each exists as an empty file until written
+    with stats.stage("paths"):
+        names = reserve_filenames(full_output_folder, filename, engine.extension,
+                                  1 if multi_frame else len(pixels),
+                                  options["shard_layout"], options["shard_size"])
+
+    reserved = [os.path.join(full_output_folder, shard, file) for _, file, shard in names]
+    try:
+        items = []
+        counters = []
+        for batch_number, (counter, file, shard) in enumerate(names):
+            path = os.path.join(full_output_folder, shard, file)
+            items.append((batch_number, path, metadata))
+            counters.append(counter)
+
+            results.append({
+                "filename": file,
+                "subfolder": os.path.join(subfolder, shard) if shard else subfolder,
+                "type": node.type
+            })
+
+        on_success = []
+        # Dedup hashes the quantized pixels of one image per file, which streamed
+        # images never have in full and multi-frame files don't have
+        if options["dedup"] and not streaming and not multi_frame:
+            with stats.stage("dedup"):
+                store = get_object_store(node.output_dir)
+                base = batch_digest(engine.name, encoder_options, zip_threshold, entries)
+                to_encode, published, late_links = [], [], []
+                seen = set()
+                for item in items:
+                    batch_number, path, _ = item
+                    digest = content_digest(base, pixels[batch_number])
+                    if store.link_output(digest, engine.extension, path):
+                        continue
+                    if digest in seen:
+                        # Same image earlier in this batch: link once that one is written
+                        late_links.append((digest, path))
+                        continue
+                    seen.add(digest)
+                    to_encode.append(item)
+                    published.append((digest, path))
+                items = to_encode
+            on_success.append(functools.partial(publish_outputs, store, engine.extension,
+                                                published, late_links))
+
+        if adaptive:
+            # Only the images left after dedup are encoded; a multi-frame file holds them all
+            encoded_bytes = frame_bytes * (len(images) if multi_frame else len(items))
+            job = functools.partial(_encode_measured, node.compression, encoded_bytes, encode)
+        else:
+            job = encode
+        if not items:
+            # Every image was linked to an identical earlier output
+            job = None
+        args = (pixels, items, engine.name, encoder_options,
+                options["executor"], options["encode_workers"], stats)
+        ui = {"images": results}
+
+        if options["preview_size"] > 0:
+            # Point the frontend at small previews; the full files are still written below
+            with stats.stage("preview"):
+                ui["images"] = write_previews(pixels, counters, filename,
+                                              folder_paths.get_temp_directory(),
+                                              options["preview_size"], options["preview_format"],
+                                              quantized=not streaming)
+
+        if options["index_metadata"]:
+            rows = [{
+                "path": os.path.join(result["subfolder"], result["filename"]),
+                "subfolder": result["subfolder"],
+                "filename": result["filename"],
+                "counter": counters[n],
+                "width": pixels.shape[2],
+                "height": pixels.shape[1],
+                "format": engine.name,
+                "node": type(node).__name__,
+                "prompt_text": prompt_text,
+                "custom_metadata": custom_metadata,
+            } for n, result in enumerate(results)]
+            index = get_index(default_index_path(node.output_dir))
+            # Index only once the files exist
+            on_success.append(functools.partial(index.add, rows))
+
+        if save_queue is not None:
+            if options["instrumentation"] == "log+ui":
+                # Only the executor-side stages are known before the background write
+                ui["metasaver_stats"] = [stats.as_record()]
+            save_queue.submit(results[0]["filename"], _run_batch, job, args, stats,
+                              on_success, reserved)
+        else:
+            record = _run_batch(job, args, stats, on_success, reserved)
+            if options["instrumentation"] == "log+ui":
+                ui["metasaver_stats"] = [record]
+    except BaseException:
+        # Nothing was handed to the background queue; drop the names not written
+        release_unwritten(reserved)
+        raise
+
+    return {"ui": ui}
+
+
+def _save_archive_batch(node, pixels, engine, metadata, encoder_options, filename,
+                        full_output_folder, prompt_text, custom_metadata, options, save_queue,
+                        stats):
+    """
+    Archive mode of _write_image_batch: append the batch to the prefix's tar shards.
+
+    The ui result has no files to show, so it lists the previews when
+    preview_size is set and nothing otherwise.
+
+    Args:
+        node: The calling node
+        pixels: Quantized batch
+        engine: Format engine
+        metadata: Container metadata built by the engine
+        encoder_options: Encoder settings
+        filename: Base filename of the prefix, which names the shards
+        full_output_folder: Folder the shards are written to
+        prompt_text: Prompt JSON, hashed into the manifest
+        custom_metadata: The custom fields, stored in the manifest
+        options: Save settings from _image_save_options
+        save_queue: Background queue, or None to write synchronously
+        stats: SaveStats for this call
+    """
+    writer = get_archive_writer(full_output_folder, filename, options["archive_shard_mb"] << 20)
+    prompt_hash = hashlib.sha256(prompt_text.encode("utf-8")).hexdigest() if prompt_text else None
+    fields = {
+        "width": pixels.shape[2],
+        "height": pixels.shape[1],
+        "format": engine.name,
+        "custom_metadata": custom_metadata,
+        "prompt_sha256": prompt_hash,
+    }
+    items = [(batch_number, metadata) for batch_number in range(len(pixels))]
+    job = functools.partial(archive_batch, writer, [fields] * len(items))
+    args = (pixels, items, engine.name, encoder_options,
+            options["executor"], options["encode_workers"], stats)
+
+    ui = {"images": []}
+    if options["preview_size"] > 0:
+        with stats.stage("preview"):
+            ui["images"] = write_previews(pixels, range(1, len(pixels) + 1), filename,
+                                          folder_paths.get_temp_directory(),
+                                          options["preview_size"], options["preview_format"])
+
+    if save_queue is not None:
+        if options["instrumentation"] == "log+ui":
+            ui["metasaver_stats"] = [stats.as_record()]
+        save_queue.submit(f"{filename} archive", _run_batch, job, args, stats)
+    else:
+        record = _run_batch(job, args, stats)
+        if options["instrumentation"] == "log+ui":
+            ui["metasaver_stats"] = [record]
+
+    return {"ui": ui}
+
+
 class MetaSaverNode:
     """
     A ComfyUI custom node that saves images with custom metadata fields.
@@ -31,7 +464,7 @@ class MetaSaverNode:
         self.output_dir = folder_paths.get_output_directory()
         self.type = "output"
         self.prefix_append = ""
-        self.compress_level = 4
+        self.compression = AdaptiveCompression()
 
     @classmethod
     def INPUT_TYPES(cls):
@@ -41,6 +474,7 @@ class MetaSaverNode:
         for i in range(10):
             optional_inputs[f"meta_name_{i}"] = ("STRING", {"default": "", "multiline": False})
             optional_inputs[f"meta_value_{i}"] = (ANY,)
+        optional_inputs.update(IMAGE_SAVE_OPTIONS)
 
         return {
             "required": {
@@ -62,7 +496,7 @@ class MetaSaverNode:
     def save_images(self, images, filename_prefix="ComfyUI",
                     prompt=None, extra_pnginfo=None, **kwargs):
         """
-        Save images with custom metadata embedded in PNG files.
+        Save images with custom metadata embedded in PNG, WebP or JPEG files.
 
         Args:
             images: Tensor of images to save
@@ -70,77 +504,46 @@ class MetaSaverNode:
             prompt: ComfyUI workflow prompt (auto-injected)
             extra_pnginfo: Extra PNG info (auto-injected)
             **kwargs: Dynamic metadata fields (meta_name_0, meta_value_0, etc.)
+                and the save settings in IMAGE_SAVE_OPTIONS
         """
-        filename_prefix += self.prefix_append
-        full_output_folder, filename, counter, subfolder, filename_prefix = \
-            folder_paths.get_save_image_path(filename_prefix, self.output_dir,
-                                            images[0].shape[1], images[0].shape[0])
+        options = _image_save_options(kwargs)
+        stats = start_stats(type(self).__name__, options["instrumentation"],
+                            options["trace_memory"])
 
-        results = list()
+        with stats.stage("metadata"):
+            # Collect custom metadata from kwargs (check up to 10 fields)
+            custom_metadata = {}
+            for i in range(10):
+                field_name_key = f"meta_name_{i}"
+                field_value_key = f"meta_value_{i}"
 
-        # Collect custom metadata from kwargs (check up to 10 fields)
-        custom_metadata = {}
-        for i in range(10):
-            field_name_key = f"meta_name_{i}"
-            field_value_key = f"meta_value_{i}"
-
-            if field_name_key in kwargs and field_value_key in kwargs:
-                field_name = kwargs[field_name_key]
-                field_value = kwargs[field_value_key]
-
-                # Only add if both name and value are provided
-                if field_name and field_name.strip():
-                    custom_metadata[field_name] = self._format_value(field_value)
+                if field_name_key in kwargs and field_value_key in kwargs:
+                    field_name = kwargs[field_name_key]
+                    field_value = kwargs[field_value_key]
 
-        for (batch_number, image) in enumerate(images):
-            # Convert tensor to PIL Image
-            i = 255. * image.cpu().numpy()
-            img = Image.fromarray(np.clip(i, 0, 255).astype(np.uint8))
+                    # Only add if both name and value are provided
+                    if field_name and field_name.strip():
+                        custom_metadata[field_name] = format_value(field_value)
 
-            # Prepare PNG metadata
-            metadata = PngInfo()
+            entries = []
 
             # Add ComfyUI workflow metadata (standard)
             if prompt is not None:
-                metadata.add_text("prompt", json.dumps(prompt))
+                entries.append(("prompt", dumps_json(prompt), True))
             if extra_pnginfo is not None:
                 for key, value in extra_pnginfo.items():
-                    metadata.add_text(key, json.dumps(value))
+                    entries.append((key, dumps_json(value), True))
 
             # Add custom metadata
             if custom_metadata:
-                metadata.add_text("custom_metadata", json.dumps(custom_metadata))
+                entries.append(("custom_metadata", dumps_json(custom_metadata), True))
 
                 # Also add individual fields for easier reading
                 for key, value in custom_metadata.items():
-                    metadata.add_text(key, str(value))
-
-            # Generate filename
-            file = f"{filename}_{counter:05}_.png"
-            img.save(os.path.join(full_output_folder, file),
-                    pnginfo=metadata,
-                    compress_level=self.compress_level)
-
-            results.append({
-                "filename": file,
-                "subfolder": subfolder,
-                "type": self.type
-            })
+                    entries.append((key, str(value), False))
 
-            counter += 1
-
-        return {"ui": {"images": results}}
-
-    def _format_value(self, value):
-        """Format values for JSON serialization."""
-        if isinstance(value, (int, float, str, bool)):
-            return value
-        elif isinstance(value, (list, tuple)):
-            # Handle arrays (like seeds from multiple samplers)
-            return list(value)
-        else:
-            # Convert to string as fallback
-            return str(value)
+        return _save_image_batch(self, images, filename_prefix, entries, custom_metadata,
+                                 options, stats)
 
 
 class MetaSaverDynamicNode:
@@ -153,7 +556,7 @@ class MetaSaverDynamicNode:
         self.output_dir = folder_paths.get_output_directory()
         self.type = "output"
         self.prefix_append = ""
-        self.compress_level = 4
+        self.compression = AdaptiveCompression()
 
     @classmethod
     def INPUT_TYPES(cls):
@@ -162,6 +565,7 @@ class MetaSaverDynamicNode:
         for i in range(20):
             optional_inputs[f"meta_name_{i}"] = ("STRING", {"default": "", "multiline": False})
             optional_inputs[f"meta_value_{i}"] = (ANY,)
+        optional_inputs.update(IMAGE_SAVE_OPTIONS)
 
         return {
             "required": {
@@ -183,7 +587,7 @@ class MetaSaverDynamicNode:
     def save_images(self, images, filename_prefix="ComfyUI",
                     prompt=None, extra_pnginfo=None, **kwargs):
         """
-        Save images with custom metadata embedded in PNG files.
+        Save images with custom metadata embedded in PNG, WebP or JPEG files.
 
         Args:
             images: Tensor of images to save
@@ -191,79 +595,46 @@ class MetaSaverDynamicNode:
             prompt: ComfyUI workflow prompt (auto-injected)
             extra_pnginfo: Extra PNG info (auto-injected)
             **kwargs: Dynamic metadata fields (meta_name_0, meta_value_0, etc.)
+                and the save settings in IMAGE_SAVE_OPTIONS
         """
-        filename_prefix += self.prefix_append
-        full_output_folder, filename, counter, subfolder, filename_prefix = \
-            folder_paths.get_save_image_path(filename_prefix, self.output_dir,
-                                            images[0].shape[1], images[0].shape[0])
+        options = _image_save_options(kwargs)
+        stats = start_stats(type(self).__name__, options["instrumentation"],
+                            options["trace_memory"])
 
-        results = list()
+        with stats.stage("metadata"):
+            # Collect custom metadata from kwargs (check up to 20 fields)
+            custom_metadata = {}
+            for i in range(20):
+                field_name_key = f"meta_name_{i}"
+                field_value_key = f"meta_value_{i}"
 
-        # Collect custom metadata from kwargs (check up to 20 fields)
-        custom_metadata = {}
-        for i in range(20):
-            field_name_key = f"meta_name_{i}"
-            field_value_key = f"meta_value_{i}"
+                if field_name_key in kwargs and field_value_key in kwargs:
+                    field_name = kwargs[field_name_key]
+                    field_value = kwargs[field_value_key]
 
-            if field_name_key in kwargs and field_value_key in kwargs:
-                field_name = kwargs[field_name_key]
-                field_value = kwargs[field_value_key]
+                    # Only add if both name and value are provided
+                    if field_name and field_name.strip():
+                        custom_metadata[field_name] = format_value(field_value)
 
-                # Only add if both name and value are provided
-                if field_name and field_name.strip():
-                    custom_metadata[field_name] = self._format_value(field_value)
-
-        for (batch_number, image) in enumerate(images):
-            # Convert tensor to PIL Image
-            i = 255. * image.cpu().numpy()
-            img = Image.fromarray(np.clip(i, 0, 255).astype(np.uint8))
-
-            # Prepare PNG metadata
-            metadata = PngInfo()
+            entries = []
 
             # Add ComfyUI workflow metadata (standard)
             if prompt is not None:
-                metadata.add_text("prompt", json.dumps(prompt))
+                entries.append(("prompt", dumps_json(prompt), True))
             if extra_pnginfo is not None:
                 for key, value in extra_pnginfo.items():
-                    metadata.add_text(key, json.dumps(value))
+                    entries.append((key, dumps_json(value), True))
 
             # Add custom metadata as structured JSON
             if custom_metadata:
-                metadata.add_text("custom_metadata", json.dumps(custom_metadata, indent=2))
+                entries.append(("custom_metadata", dumps_json(custom_metadata, indent=True), True))
 
                 # Also add individual fields for easier external reading
                 for key, value in custom_metadata.items():
-                    metadata.add_text(f"meta_{key}", str(value))
+                    entries.append((f"meta_{key}", str(value), False))
 
-            # Generate filename
-            file = f"{filename}_{counter:05}_.png"
-            img.save(os.path.join(full_output_folder, file),
-                    pnginfo=metadata,
-                    compress_level=self.compress_level)
-
-            results.append({
-                "filename": file,
-                "subfolder": subfolder,
-                "type": self.type
-            })
-
-            counter += 1
-
-        return {"ui": {"images": results}}
-
-    def _format_value(self, value):
-        """Format values for JSON serialization."""
-        if isinstance(value, (int, float, str, bool)):
-            return value
-        elif isinstance(value, (list, tuple)):
-            # Handle arrays (like seeds from multiple samplers)
-            return list(value)
-        elif hasattr(value, 'item'):  # numpy types
-            return value.item()
-        else:
-            # Convert to string as fallback
-            return str(value)
+        return _save_image_batch(self, images, filename_prefix, entries, custom_metadata,
+                                 options, stats)
 
 
 class MetaVideoSaverNode:
@@ -284,6 +655,7 @@ class MetaVideoSaverNode:
         for i in range(10):
             optional_inputs[f"meta_name_{i}"] = ("STRING", {"default": "", "multiline": False})
             optional_inputs[f"meta_value_{i}"] = (ANY,)
+        optional_inputs.update(VIDEO_SAVE_OPTIONS)
 
         return {
             "required": {
@@ -305,51 +677,61 @@ class MetaVideoSaverNode:
     CATEGORY = "image/video"
 
     def save_video(self, video, filename_prefix="video/ComfyUI", format="auto", codec="auto",
-                   prompt=None, extra_pnginfo=None, **kwargs):
-        width, height = video.get_dimensions()
-        full_output_folder, filename, counter, subfolder, filename_prefix = \
-            folder_paths.get_save_image_path(filename_prefix, self.output_dir, width, height)
+                   prompt=None, extra_pnginfo=None, instrumentation="off", trace_memory=False,
+                   index_metadata=False, shard_layout="off", shard_size=1000, **kwargs):
+        stats = start_stats(type(self).__name__, instrumentation, trace_memory)
 
-        # Collect custom metadata
-        custom_metadata = {}
-        for i in range(10):
-            name_key = f"meta_name_{i}"
-            val_key = f"meta_value_{i}"
-            if name_key in kwargs and val_key in kwargs:
-                field_name = kwargs[name_key]
-                if field_name and field_name.strip():
-                    custom_metadata[field_name] = self._format_value(kwargs[val_key])
-
-        # Build metadata dict — save_to JSON-serialises all values automatically
-        metadata = {}
-        if extra_pnginfo is not None:
-            metadata.update(extra_pnginfo)
-        if prompt is not None:
-            metadata["prompt"] = prompt
-        if custom_metadata:
-            metadata["custom_metadata"] = custom_metadata
-            for key, value in custom_metadata.items():
-                metadata[key] = str(value)
+        width, height = video.get_dimensions()
+        with stats.stage("paths"):
+            full_output_folder, filename, subfolder, filename_prefix = \
+                resolve_save_path(filename_prefix, self.output_dir, width, height)
+
+        with stats.stage("metadata"):
+            # Collect custom metadata
+            custom_metadata = {}
+            for i in range(10):
+                name_key = f"meta_name_{i}"
+                val_key = f"meta_value_{i}"
+                if name_key in kwargs and val_key in kwargs:
+                    field_name = kwargs[name_key]
+                    if field_name and field_name.strip():
+                        custom_metadata[field_name] = format_value(kwargs[val_key])
+
+            # Build metadata dict — save_to JSON-serialises all values automatically
+            metadata = {}
+            if extra_pnginfo is not None:
+                metadata.update(extra_pnginfo)
+            if prompt is not None:
+                metadata["prompt"] = prompt
+            if custom_metadata:
+                metadata["custom_metadata"] = custom_metadata
+                for key, value in custom_metadata.items():
+                    metadata[key] = str(value)
 
         ext = "mp4" if format in ("auto", "mp4") else format
-        file = f"{filename}_{counter:05}_.{ext}"
-        output_path = os.path.join(full_output_folder, file)
-
-        video.save_to(output_path, format=format, codec=codec,
-                      metadata=metadata if metadata else None)
+        with stats.stage("paths"):
+            (counter, file, shard), = reserve_filenames(full_output_folder, filename, ext, 1,
+                                                       shard_layout, shard_size)
+        output_path = os.path.join(full_output_folder, shard, file)
+        if shard:
+            subfolder = os.path.join(subfolder, shard)
+
+        with stats.stage("save_to"):
+            with removed_on_error(output_path):
+                video.save_to(output_path, format=format, codec=codec,
+                              metadata=metadata if metadata else None)
+        if stats.enabled:
+            stats.add_file(os.path.getsize(output_path))
+        if index_metadata:
+            _index_video(self, file, subfolder, counter, width, height, ext,
+                         None if prompt is None else dumps_json(prompt), custom_metadata)
 
         results = [{"filename": file, "subfolder": subfolder, "type": self.type}]
-        return {"ui": {"videos": results}}
-
-    def _format_value(self, value):
-        if isinstance(value, (int, float, str, bool)):
-            return value
-        elif isinstance(value, (list, tuple)):
-            return list(value)
-        elif hasattr(value, "item"):
-            return value.item()
-        else:
-            return str(value)
+        ui = {"videos": results}
+        record = stats.finish()
+        if instrumentation == "log+ui":
+            ui["metasaver_stats"] = [record]
+        return {"ui": ui}
 
 
 class MetaVideoSaverDynamicNode:
@@ -368,6 +750,7 @@ class MetaVideoSaverDynamicNode:
         for i in range(20):
             optional_inputs[f"meta_name_{i}"] = ("STRING", {"default": "", "multiline": False})
             optional_inputs[f"meta_value_{i}"] = (ANY,)
+        optional_inputs.update(VIDEO_SAVE_OPTIONS)
 
         return {
             "required": {
@@ -389,10 +772,243 @@ class MetaVideoSaverDynamicNode:
     CATEGORY = "image/video"
 
     def save_video(self, video, filename_prefix="video/ComfyUI", format="auto", codec="auto",
-                   prompt=None, extra_pnginfo=None, **kwargs):
+                   prompt=None, extra_pnginfo=None, instrumentation="off", trace_memory=False,
+                   index_metadata=False, shard_layout="off", shard_size=1000, **kwargs):
+        stats = start_stats(type(self).__name__, instrumentation, trace_memory)
+
         width, height = video.get_dimensions()
-        full_output_folder, filename, counter, subfolder, filename_prefix = \
-            folder_paths.get_save_image_path(filename_prefix, self.output_dir, width, height)
+        with stats.stage("paths"):
+            full_output_folder, filename, subfolder, filename_prefix = \
+                resolve_save_path(filename_prefix, self.output_dir, width, height)
+
+        with stats.stage("metadata"):
+            custom_metadata = {}
+            for i in range(20):
+                name_key = f"meta_name_{i}"
+                val_key = f"meta_value_{i}"
+                if name_key in kwargs and val_key in kwargs:
+                    field_name = kwargs[name_key]
+                    if field_name and field_name.strip():
+                        custom_metadata[field_name] = format_value(kwargs[val_key])
+
+            metadata = {}
+            if extra_pnginfo is not None:
+                metadata.update(extra_pnginfo)
+            if prompt is not None:
+                metadata["prompt"] = prompt
+            if custom_metadata:
+                metadata["custom_metadata"] = custom_metadata
+                for key, value in custom_metadata.items():
+                    metadata[f"meta_{key}"] = str(value)
+
+        ext = "mp4" if format in ("auto", "mp4") else format
+        with stats.stage("paths"):
+            (counter, file, shard), = reserve_filenames(full_output_folder, filename, ext, 1,
+                                                       shard_layout, shard_size)
+        output_path = os.path.join(full_output_folder, shard, file)
+        if shard:
+            subfolder = os.path.join(subfolder, shard)
+
+        with stats.stage("save_to"):
+            with removed_on_error(output_path):
+                video.save_to(output_path, format=format, codec=codec,
+                              metadata=metadata if metadata else None)
+        if stats.enabled:
+            stats.add_file(os.path.getsize(output_path))
+        if index_metadata:
+            _index_video(self, file, subfolder, counter, width, height, ext,
+                         None if prompt is None else dumps_json(prompt), custom_metadata)
+
+        results = [{"filename": file, "subfolder": subfolder, "type": self.type}]
+        ui = {"videos": results}
+        record = stats.finish()
+        if instrumentation == "log+ui":
+            ui["metasaver_stats"] = [record]
+        return {"ui": ui}
+
+
+class MetaVideoStreamSaverNode:
+    """
+    Saves an IMAGE batch as an MP4 with custom metadata in the container tags.
+
+    Unlike MetaVideoSaverNode this does not need a VIDEO object: frames are
+    quantized and encoded in small chunks with PyAV, so memory use does not
+    grow with the clip length beyond the IMAGE input itself.
+    """
+
+    def __init__(self):
+        self.output_dir = folder_paths.get_output_directory()
+        self.type = "output"
+        self.prefix_append = ""
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        optional_inputs = {}
+        for i in range(20):
+            optional_inputs[f"meta_name_{i}"] = ("STRING", {"default": "", "multiline": False})
+            optional_inputs[f"meta_value_{i}"] = (ANY,)
+        optional_inputs.update({
+            "codec": (VIDEO_CODECS, {"default": "h264"}),
+            "crf": ("INT", {"default": 23, "min": 0, "max": 51}),
+            "preset": (X264_PRESETS, {"default": "medium"}),
+            "encode_threads": ("INT", {"default": 0, "min": 0, "max": 64}),
+            "chunk_frames": ("INT", {"default": 16, "min": 1, "max": 1024}),
+        })
+        optional_inputs.update(VIDEO_SAVE_OPTIONS)
+
+        return {
+            "required": {
+                "images": ("IMAGE",),
+                "fps": ("FLOAT", {"default": 24.0, "min": 0.01, "max": 1000.0, "step": 0.01}),
+                "filename_prefix": ("STRING", {"default": "video/ComfyUI"}),
+            },
+            "optional": optional_inputs,
+            "hidden": {
+                "prompt": "PROMPT",
+                "extra_pnginfo": "EXTRA_PNGINFO"
+            },
+        }
+
+    RETURN_TYPES = ()
+    FUNCTION = "save_video"
+    OUTPUT_NODE = True
+    CATEGORY = "image/video"
+
+    def save_video(self, images, fps=24.0, filename_prefix="video/ComfyUI", prompt=None,
+                   extra_pnginfo=None, codec="h264", crf=23, preset="medium", encode_threads=0,
+                   chunk_frames=16, instrumentation="off", trace_memory=False,
+                   index_metadata=False, shard_layout="off", shard_size=1000, **kwargs):
+        """
+        Encode images to an MP4 with custom metadata.
+
+        Args:
+            images: Tensor of frames to encode
+            fps: Frame rate of the video
+            filename_prefix: Prefix for saved filenames
+            prompt: ComfyUI workflow prompt (auto-injected)
+            extra_pnginfo: Extra PNG info (auto-injected)
+            codec: Video codec
+            crf: Constant rate factor (lower = better quality, bigger file)
+            preset: Encoder speed preset
+            encode_threads: Encoder threads (0 = automatic)
+            chunk_frames: Frames converted at a time
+            index_metadata: Record the video in the SQLite metadata index
+            **kwargs: Dynamic metadata fields (meta_name_0, meta_value_0, etc.)
+        """
+        stats = start_stats(type(self).__name__, instrumentation, trace_memory)
+
+        with stats.stage("paths"):
+            full_output_folder, filename, subfolder, filename_prefix = \
+                resolve_save_path(filename_prefix, self.output_dir,
+                                  images[0].shape[1], images[0].shape[0])
+
+        with stats.stage("metadata"):
+            custom_metadata = {}
+            for i in range(20):
+                name_key = f"meta_name_{i}"
+                val_key = f"meta_value_{i}"
+                if name_key in kwargs and val_key in kwargs:
+                    field_name = kwargs[name_key]
+                    if field_name and field_name.strip():
+                        custom_metadata[field_name] = format_value(kwargs[val_key])
+
+            # Same container tags as MetaVideoSaverDynamicNode
+            metadata = {}
+            if extra_pnginfo is not None:
+                metadata.update(extra_pnginfo)
+            if prompt is not None:
+                metadata["prompt"] = prompt
+            if custom_metadata:
+                metadata["custom_metadata"] = custom_metadata
+                for key, value in custom_metadata.items():
+                    metadata[f"meta_{key}"] = str(value)
+
+        with stats.stage("paths"):
+            (counter, file, shard), = reserve_filenames(full_output_folder, filename, "mp4", 1,
+                                                       shard_layout, shard_size)
+        output_path = os.path.join(full_output_folder, shard, file)
+        if shard:
+            subfolder = os.path.join(subfolder, shard)
+
+        with removed_on_error(output_path):
+            width, height = encode_images(images, output_path, fps, metadata, codec=codec,
+                                          crf=crf, preset=preset, threads=encode_threads,
+                                          chunk_frames=chunk_frames, stats=stats)
+        if stats.enabled:
+            stats.add_file(os.path.getsize(output_path))
+        if index_metadata:
+            # The size actually encoded, which is cropped to even dimensions
+            _index_video(self, file, subfolder, counter, width, height, "mp4",
+                         None if prompt is None else dumps_json(prompt), custom_metadata)
+
+        results = [{"filename": file, "subfolder": subfolder, "type": self.type}]
+        ui = {"videos": results}
+        record = stats.finish()
+        if instrumentation == "log+ui":
+            ui["metasaver_stats"] = [record]
+        return {"ui": ui}
+
+
+class MetaVideoRemuxNode:
+    """
+    Sets custom metadata on an existing video in the output folder.
+
+    Only the container tags are rewritten; the audio and video packets are
+    stream-copied, so no quality is lost and the cost is roughly a file copy.
+    """
+
+    def __init__(self):
+        self.output_dir = folder_paths.get_output_directory()
+        self.type = "output"
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        optional_inputs = {}
+        for i in range(20):
+            optional_inputs[f"meta_name_{i}"] = ("STRING", {"default": "", "multiline": False})
+            optional_inputs[f"meta_value_{i}"] = (ANY,)
+        optional_inputs.update({
+            "replace_existing": ("BOOLEAN", {"default": False}),
+            "filename_prefix": ("STRING", {"default": ""}),
+            "field_prefix": (list(REMUX_FIELD_PREFIXES), {"default": "auto"}),
+            "index_metadata": IMAGE_SAVE_OPTIONS["index_metadata"],
+        })
+
+        return {
+            "required": {
+                "video_path": ("STRING", {"default": "video/ComfyUI_00001_.mp4"}),
+            },
+            "optional": optional_inputs,
+        }
+
+    RETURN_TYPES = ()
+    FUNCTION = "remux_video"
+    OUTPUT_NODE = True
+    CATEGORY = "image/video"
+
+    def remux_video(self, video_path, replace_existing=False, filename_prefix="",
+                    field_prefix="auto", index_metadata=False, **kwargs):
+        """
+        Rewrite a video's custom metadata tags without re-encoding.
+
+        Args:
+            video_path: Video path relative to the output folder
+            replace_existing: Drop custom fields already in the file instead of merging
+            filename_prefix: Save a new numbered copy with this prefix instead of
+                rewriting the file in place
+            field_prefix: Per-field tag style: "meta_" (Dynamic and stream saver
+                nodes), "none" for bare tags (MetaVideoSaver), or "auto" to keep
+                the file's own
+            index_metadata: Record the written video in the SQLite metadata index,
+                replacing the row of a video rewritten in place
+            **kwargs: Dynamic metadata fields (meta_name_0, meta_value_0, etc.)
+        """
+        output_dir = os.path.abspath(self.output_dir)
+        src = os.path.abspath(os.path.join(output_dir, video_path))
+        if os.path.commonpath((output_dir, src)) != output_dir:
+            raise ValueError(f"Video must be inside the output folder: {video_path}")
+        if not os.path.isfile(src):
+            raise FileNotFoundError(f"Video not found: {video_path}")
 
         custom_metadata = {}
         for i in range(20):
@@ -401,37 +1017,32 @@ class MetaVideoSaverDynamicNode:
             if name_key in kwargs and val_key in kwargs:
                 field_name = kwargs[name_key]
                 if field_name and field_name.strip():
-                    custom_metadata[field_name] = self._format_value(kwargs[val_key])
-
-        metadata = {}
-        if extra_pnginfo is not None:
-            metadata.update(extra_pnginfo)
-        if prompt is not None:
-            metadata["prompt"] = prompt
-        if custom_metadata:
-            metadata["custom_metadata"] = custom_metadata
-            for key, value in custom_metadata.items():
-                metadata[f"meta_{key}"] = str(value)
-
-        ext = "mp4" if format in ("auto", "mp4") else format
-        file = f"{filename}_{counter:05}_.{ext}"
-        output_path = os.path.join(full_output_folder, file)
-
-        video.save_to(output_path, format=format, codec=codec,
-                      metadata=metadata if metadata else None)
-
-        results = [{"filename": file, "subfolder": subfolder, "type": self.type}]
-        return {"ui": {"videos": results}}
-
-    def _format_value(self, value):
-        if isinstance(value, (int, float, str, bool)):
-            return value
-        elif isinstance(value, (list, tuple)):
-            return list(value)
-        elif hasattr(value, "item"):
-            return value.item()
-        else:
-            return str(value)
+                    custom_metadata[field_name] = format_value(kwargs[val_key])
+
+        dst = None
+        if filename_prefix:
+            full_output_folder, filename, _, _ = resolve_save_path(filename_prefix, output_dir)
+            (_, file, _), = reserve_filenames(full_output_folder, filename,
+                                              os.path.splitext(src)[1].lstrip("."))
+            dst = os.path.join(full_output_folder, file)
+        # In place, the source is only replaced once the new file is complete
+        with removed_on_error(dst) if dst is not None else contextlib.nullcontext():
+            written = remux_metadata(src, custom_metadata, dst, replace=replace_existing,
+                                     field_prefix=REMUX_FIELD_PREFIXES[field_prefix])
+
+        subfolder, file = os.path.split(os.path.relpath(written, output_dir))
+        if index_metadata:
+            # Index what the file now holds: the merged custom fields and its own prompt
+            tags, width, height = probe_video(written)
+            try:
+                prompt_text = dumps_json(json.loads(tags["prompt"])) if "prompt" in tags else None
+            except json.JSONDecodeError:
+                prompt_text = None
+            match = OUTPUT_NAME.match(file)
+            _index_video(self, file, subfolder, int(match.group("counter")) if match else None,
+                         width, height, os.path.splitext(file)[1].lstrip("."), prompt_text,
+                         existing_custom_metadata(tags))
+        return {"ui": {"videos": [{"filename": file, "subfolder": subfolder, "type": self.type}]}}
 
 
 # Node registration
@@ -440,6 +1051,8 @@ NODE_CLASS_MAPPINGS = {
     "MetaSaverDynamic": MetaSaverDynamicNode,
     "MetaVideoSaver": MetaVideoSaverNode,
     "MetaVideoSaverDynamic": MetaVideoSaverDynamicNode,
+    "MetaVideoStreamSaver": MetaVideoStreamSaverNode,
+    "MetaVideoRemux": MetaVideoRemuxNode,
 }
 
 NODE_DISPLAY_NAME_MAPPINGS = {
@@ -447,4 +1060,6 @@ NODE_DISPLAY_NAME_MAPPINGS = {
     "MetaSaverDynamic": "Save Image with Custom Metadata (Dynamic)",
     "MetaVideoSaver": "Save Video with Custom Metadata",
     "MetaVideoSaverDynamic": "Save Video with Custom Metadata (Dynamic)",
+    "MetaVideoStreamSaver": "Save Video from Images with Custom Metadata",
+    "MetaVideoRemux": "Set Video Metadata (No Re-encode)",
 }
@@ -0,0 +1,189 @@
+"""
+Write-time SQLite index of saved outputs.
+
+When indexing is enabled the saver nodes append one row per saved file:
+its path, subfolder, counter, dimensions, format, a hash of the prompt and
+the custom metadata fields. Rows are handed to a background thread that
+writes them in batched transactions, so the save path only pays for a queue
+put.
+
+Custom fields live in a separate (name, value) table with a composite index,
+which makes "all outputs where field X = Y" an index lookup instead of a scan
+over every file. See examples/query_index.py for a query CLI.
+
+The database defaults to metasaver_index.sqlite in the ComfyUI output
+directory; set METASAVER_INDEX_DB to use another path.
+"""
+
+import atexit
+import hashlib
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILENAME = "metasaver_index.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outputs (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    subfolder TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    counter INTEGER,
+    width INTEGER,
+    height INTEGER,
+    format TEXT,
+    node TEXT,
+    prompt_hash TEXT,
+    custom_metadata TEXT,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS fields (
+    output_id INTEGER NOT NULL REFERENCES outputs(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    value TEXT,
+    num REAL
+);
+CREATE INDEX IF NOT EXISTS outputs_subfolder ON outputs(subfolder, counter);
+CREATE INDEX IF NOT EXISTS outputs_prompt_hash ON outputs(prompt_hash);
+CREATE INDEX IF NOT EXISTS outputs_created ON outputs(created);
+CREATE INDEX IF NOT EXISTS fields_name_value ON fields(name, value);
+CREATE INDEX IF NOT EXISTS fields_name_num ON fields(name, num);
+CREATE INDEX IF NOT EXISTS fields_output ON fields(output_id);
+"""
+
+
+def prompt_hash(prompt_text):
+    """Stable hash of the serialized prompt, or None when there is no prompt."""
+    if prompt_text is None:
+        return None
+    return hashlib.sha256(prompt_text.encode("utf-8")).hexdigest()
+
+
+def field_value(value):
+    """Return the (text, numeric) column values stored for a custom field."""
+    if isinstance(value, bool):
+        return str(value), float(value)
+    if isinstance(value, (int, float)):
+        return str(value), float(value)
+    if isinstance(value, str):
+        return value, None
+    return json.dumps(value), None
+
+
+class MetadataIndex:
+    """
+    SQLite index fed from a background writer thread.
+
+    add() never touches the database; the writer drains the queue and commits
+    everything that has accumulated in one transaction.
+    """
+
+    # Upper bound on rows per transaction
+    BATCH_ROWS = 1000
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._writer, name="MetaSaver-index", daemon=True)
+        self._thread.start()
+
+    def add(self, rows):
+        """
+        Queue rows for insertion.
+
+        Args:
+            rows: List of dicts with path, subfolder, filename, counter, width, height,
+                format, node, prompt_text and custom_metadata keys
+        """
+        if rows:
+            self._queue.put(rows)
+
+    def flush(self):
+        """Block until every queued row has been committed."""
+        self._queue.join()
+
+    def _connect(self):
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        conn.executescript(SCHEMA)
+        return conn
+
+    def _writer(self):
+        conn = None
+        while True:
+            batches = [self._queue.get()]
+            # Gather whatever else is already waiting into the same transaction
+            while sum(len(rows) for rows in batches) < self.BATCH_ROWS:
+                try:
+                    batches.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                if conn is None:
+                    conn = self._connect()
+                with conn:
+                    for rows in batches:
+                        self._insert(conn, rows)
+            except Exception:
+                logger.exception("MetaSaver: failed to write %d row(s) to metadata index %s",
+                                 sum(len(rows) for rows in batches), self.db_path)
+            finally:
+                for _ in batches:
+                    self._queue.task_done()
+
+    @staticmethod
+    def _insert(conn, rows):
+        now = time.time()
+        for row in rows:
+            custom = row.get("custom_metadata") or {}
+            # Re-saving to the same path replaces the old row and its fields
+            conn.execute("DELETE FROM outputs WHERE path = ?", (row["path"],))
+            cursor = conn.execute(
+                "INSERT INTO outputs (path, subfolder, filename, counter, width, height, format,"
+                " node, prompt_hash, custom_metadata, created)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (row["path"], row["subfolder"], row["filename"], row.get("counter"),
+                 row.get("width"), row.get("height"), row.get("format"), row.get("node"),
+                 prompt_hash(row.get("prompt_text")),
+                 json.dumps(custom) if custom else None, now))
+            conn.executemany(
+                "INSERT INTO fields (output_id, name, value, num) VALUES (?, ?, ?, ?)",
+                [(cursor.lastrowid, name) + field_value(value) for name, value in custom.items()])
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def default_index_path(output_dir):
+    return os.environ.get("METASAVER_INDEX_DB") or os.path.join(output_dir, INDEX_FILENAME)
+
+
+def get_index(db_path):
+    """Return the shared MetadataIndex for db_path, starting its writer on first use."""
+    with _indexes_lock:
+        index = _indexes.get(db_path)
+        if index is None:
+            index = MetadataIndex(db_path)
+            _indexes[db_path] = index
+        return index
+
+
+@atexit.register
+def _flush_indexes():
+    with _indexes_lock:
+        indexes = list(_indexes.values())
+    for index in indexes:
+        index.flush()
@@ -0,0 +1,187 @@
+"""
+Content-addressed store for deduplicated outputs and workflow sidecars.
+
+The store lives in a hidden ".metasaver_objects" folder in the output
+directory:
+
+    outputs/<ab>/<digest>.<ext>     one hard link per distinct encoded file
+    workflows/<ab>/<sha256>.json    workflow/prompt JSON stored once
+
+With dedup on, each image is keyed by a hash of its quantized pixels, its
+metadata and the encoder settings. If the store already has that key the
+reserved output name becomes a hard link to the stored file and nothing is
+encoded or written; otherwise the image is encoded as usual and then linked
+into the store. Hard links need the store and the outputs on one filesystem;
+where linking fails the image is simply saved normally.
+
+With workflow sidecars on, the prompt and workflow text is written to the
+store once and the image only carries "prompt_ref"/"workflow_ref" entries
+holding its SHA-256. The digest equals the prompt_hash of the metadata index.
+
+A stored output shares its inode with every output linked to it, so the
+store keeps the data alive after the outputs are deleted. prune() removes
+stored outputs that no output links to any more (link count 1); see
+examples/prune_objects.py.
+"""
+
+import hashlib
+import logging
+import os
+import shutil
+import threading
+
+logger = logging.getLogger(__name__)
+
+STORE_DIRNAME = ".metasaver_objects"
+
+# Metadata entries moved to the sidecar store when workflow sidecars are on
+SIDECAR_KEYS = ("prompt", "workflow")
+
+
+def batch_digest(engine_name, encoder_options, zip_threshold, entries):
+    """
+    Hash everything except the pixels that decides an output file's bytes.
+
+    Returns a hash object to be copied and finished per image by content_digest.
+    """
+    h = hashlib.blake2b(digest_size=32)
+    h.update(f"{engine_name}|{sorted(encoder_options.items())}|{zip_threshold}".encode("utf-8"))
+    for key, text, compressible in entries:
+        h.update(f"\0{key}\0{int(compressible)}\0".encode("utf-8"))
+        h.update(text.encode("utf-8"))
+    return h
+
+
+def content_digest(base, pixels):
+    """Finish a batch_digest for one image's uint8 [H, W, C] pixel array."""
+    h = base.copy()
+    h.update(str(pixels.shape).encode("ascii"))
+    h.update(pixels)
+    return h.hexdigest()
+
+
+class ObjectStore:
+    """Hard-link based object store rooted at one folder."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def _object_path(self, kind, digest, extension):
+        return os.path.join(self.root, kind, digest[:2], f"{digest}.{extension}")
+
+    @staticmethod
+    def _tmp_path(path):
+        return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+    def link_output(self, digest, extension, path):
+        """
+        Replace path with a hard link to the stored output, if there is one.
+
+        Returns True when path now is the stored file.
+
+        Args:
+            digest: content_digest of the image
+            extension: File extension without the dot
+            path: Output path (usually a reserved, empty file)
+        """
+        obj = self._object_path("outputs", digest, extension)
+        if not os.path.exists(obj):
+            return False
+        tmp = self._tmp_path(path)
+        try:
+            os.link(obj, tmp)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.debug("MetaSaver: could not link %s to %s: %s", path, obj, e)
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return False
+        return True
+
+    def publish_output(self, digest, extension, path):
+        """Add a freshly written output to the store under its digest."""
+        obj = self._object_path("outputs", digest, extension)
+        if os.path.exists(obj):
+            return
+        tmp = self._tmp_path(obj)
+        try:
+            os.makedirs(os.path.dirname(obj), exist_ok=True)
+            os.link(path, tmp)
+            # A concurrent writer publishing the same digest is harmless
+            os.replace(tmp, obj)
+        except OSError as e:
+            logger.warning("MetaSaver: could not add %s to the dedup store: %s", path, e)
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def prune(self, dry_run=False):
+        """
+        Remove stored outputs that no output file links to any more.
+
+        Returns (files removed, bytes freed). Workflow sidecars are kept, as
+        images that reference them cannot be found from the store.
+
+        Args:
+            dry_run: Only count what would be removed
+        """
+        removed = freed = 0
+        for dirpath, _, filenames in os.walk(os.path.join(self.root, "outputs")):
+            for name in filenames:
+                if name.endswith(".tmp"):
+                    # In-flight link of a concurrent save
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                    if st.st_nlink != 1:
+                        continue
+                    if not dry_run:
+                        os.remove(path)
+                except OSError as e:
+                    logger.warning("MetaSaver: could not prune %s: %s", path, e)
+                    continue
+                removed += 1
+                freed += st.st_size
+        return removed, freed
+
+    def store_text(self, text):
+        """Store a JSON text once and return its SHA-256 hex digest."""
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        path = self._object_path("workflows", digest, "json")
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = self._tmp_path(path)
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp, path)
+        return digest
+
+
+def get_object_store(output_dir):
+    """Return the object store of an output directory."""
+    return ObjectStore(os.path.join(output_dir, STORE_DIRNAME))
+
+
+def publish_outputs(store, extension, published, late_links):
+    """
+    Add encoded outputs to the store, then link the batch's own duplicates.
+
+    Args:
+        store: ObjectStore to publish into
+        extension: File extension without the dot
+        published: (digest, path) pairs of newly written files
+        late_links: (digest, path) pairs of images identical to one in published
+    """
+    written = {}
+    for digest, path in published:
+        store.publish_output(digest, extension, path)
+        written[digest] = path
+    for digest, path in late_links:
+        if not store.link_output(digest, extension, path):
+            # Store not usable (e.g. no hard links): fall back to a plain link or copy
+            tmp = ObjectStore._tmp_path(path)
+            try:
+                os.link(written[digest], tmp)
+            except OSError:
+                shutil.copyfile(written[digest], tmp)
+            os.replace(tmp, path)
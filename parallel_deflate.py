@@ -0,0 +1,203 @@
+"""
+Multi-threaded deflate for single large PNGs, in the style of pigz.
+
+The image is cut into blocks of rows. Each block is quantized, filtered and
+compressed on its own thread into a raw deflate stream that ends on a byte
+boundary (Z_SYNC_FLUSH; Z_FINISH for the last block), so the pieces can
+simply be concatenated. To keep the ratio close to a single stream, every
+block's compressor is primed with the last 32 KiB of the previous block's
+filtered data as a preset dictionary; the worker re-filters those few rows
+itself, which works because PNG filtering of a row only depends on that row
+and the one above. The zlib header is written up front, and the Adler-32
+trailer is combined from the per-block checksums.
+
+CPython's zlib and numpy release the GIL on large buffers, so plain threads
+scale with the number of cores.
+"""
+
+import atexit
+import os
+import struct
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .filename_allocator import removed_on_error
+from .image_convert import quantize_batch
+from .instrumentation import NULL_STATS
+from .png_stream import FILTER_NONE, IdatWriter, filter_strip, write_chunk, write_header
+
+# Uncompressed bytes per block; large enough to amortize the sync flush and
+# thread hand-off, small enough to spread a 100 MP image over many cores
+BLOCK_BYTES = 1 << 20
+WINDOW_SIZE = 32 * 1024
+ADLER_BASE = 65521
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def adler32_combine(adler1, adler2, len2):
+    """
+    Return the Adler-32 of two concatenated buffers from their checksums.
+
+    Port of zlib's adler32_combine.
+
+    Args:
+        adler1: Adler-32 of the first buffer
+        adler2: Adler-32 of the second buffer
+        len2: Length of the second buffer
+    """
+    rem = len2 % ADLER_BASE
+    sum1 = adler1 & 0xFFFF
+    sum2 = (rem * sum1) % ADLER_BASE
+    sum1 += (adler2 & 0xFFFF) + ADLER_BASE - 1
+    sum2 += (adler1 >> 16) + (adler2 >> 16) + ADLER_BASE - rem
+    if sum1 >= ADLER_BASE:
+        sum1 -= ADLER_BASE
+    if sum1 >= ADLER_BASE:
+        sum1 -= ADLER_BASE
+    if sum2 >= ADLER_BASE << 1:
+        sum2 -= ADLER_BASE << 1
+    if sum2 >= ADLER_BASE:
+        sum2 -= ADLER_BASE
+    return sum1 | (sum2 << 16)
+
+
+def zlib_header(level):
+    """Two-byte zlib stream header for a 32 KiB window and the given level."""
+    cmf = 0x78
+    flevel = 0 if level < 2 else 1 if level < 6 else 2 if level == 6 else 3
+    flg = flevel << 6
+    flg |= 31 - ((cmf << 8) | flg) % 31
+    return bytes((cmf, flg))
+
+
+def _filter_rows(image, start, stop, filter_rows):
+    """Quantize and filter rows [start, stop) of an image."""
+    first = max(0, start - 1)
+    rows = quantize_batch(image[first:stop])
+    width, channels = rows.shape[1], rows.shape[2]
+    if not filter_rows:
+        out = np.empty((stop - start, 1 + width * channels), dtype=np.uint8)
+        out[:, 0] = FILTER_NONE
+        out[:, 1:] = rows[start - first:].reshape(stop - start, -1)
+        return out
+    if start == 0:
+        previous = np.zeros((width, channels), dtype=np.uint8)
+    else:
+        previous = rows[0]
+    return filter_strip(rows[start - first:], previous)
+
+
+def _compress_block(image, start, stop, context_rows, level, filter_rows, last):
+    """Worker: filter and deflate one block, returning (compressed, adler32, length)."""
+    context_start = max(0, start - context_rows)
+    filtered = _filter_rows(image, context_start, stop, filter_rows)
+    split = start - context_start
+    data = filtered[split:].tobytes()
+
+    if split:
+        zdict = filtered[:split].tobytes()[-WINDOW_SIZE:]
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15, 9, zdict=zdict)
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15, 9)
+    compressed = compressor.compress(data)
+    compressed += compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+    return compressed, zlib.adler32(data), len(data)
+
+
+def _get_pool(threads):
+    with _pools_lock:
+        pool = _pools.get(threads)
+        if pool is None:
+            pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="MetaSaver-deflate")
+            _pools[threads] = pool
+        return pool
+
+
+@atexit.register
+def _shutdown_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.shutdown(wait=True)
+
+
+def write_png_parallel(image, path, pnginfo=None, compress_level=4, threads=0):
+    """
+    Write one image as PNG, compressing blocks of rows on several threads.
+
+    Returns the number of bytes written.
+
+    Args:
+        image: IMAGE tensor [H, W, C] with values in 0..1
+        path: Output file path
+        pnginfo: PngInfo with the metadata text chunks
+        compress_level: zlib level (0-9)
+        threads: Compression threads (0 = one per CPU)
+    """
+    height, width, channels = image.shape
+    threads = threads or os.cpu_count() or 1
+    row_bytes = 1 + width * channels
+    block_rows = max(1, BLOCK_BYTES // row_bytes)
+    # Rows needed in front of a block to fill the 32 KiB preset dictionary
+    context_rows = -(-WINDOW_SIZE // row_bytes)
+    filter_rows = compress_level > 0
+    pool = _get_pool(threads)
+
+    with removed_on_error(path):
+        with open(path, "wb") as f:
+            write_header(f, width, height, channels, pnginfo)
+            idat = IdatWriter(f)
+            idat.write(zlib_header(compress_level))
+
+            adler = 1
+            pending = []
+
+            def drain(future):
+                nonlocal adler
+                compressed, block_adler, length = future.result()
+                idat.write(compressed)
+                adler = adler32_combine(adler, block_adler, length)
+
+            for start in range(0, height, block_rows):
+                stop = min(height, start + block_rows)
+                pending.append(pool.submit(_compress_block, image, start, stop, context_rows,
+                                           compress_level, filter_rows, stop == height))
+                # Bound the blocks in flight so memory stays at a few blocks per thread
+                if len(pending) >= threads * 2:
+                    drain(pending.pop(0))
+            while pending:
+                drain(pending.pop(0))
+
+            idat.write(struct.pack(">I", adler))
+            idat.close()
+            write_chunk(f, b"IEND", b"")
+            return f.tell()
+
+
+def parallel_stream_batch(images, items, engine, options, mode="sequential", workers=0,
+                          stats=NULL_STATS):
+    """
+    stream_batch counterpart that deflates each image on several threads.
+
+    Args:
+        images: IMAGE tensor [B, H, W, C], not quantized
+        items: List of (batch_index, path, pnginfo) tuples
+        engine: Format engine name (always "png")
+        options: Encoder settings; compress_level and deflate_threads are used
+        mode: Ignored, the threads work inside one image at a time
+        workers: Ignored
+        stats: SaveStats that receives the encode time and sizes
+    """
+    for index, path, pnginfo in items:
+        start = time.perf_counter()
+        nbytes = write_png_parallel(images[index], path, pnginfo, options["compress_level"],
+                                    options["deflate_threads"])
+        stats.add_time("encode", time.perf_counter() - start)
+        stats.add_file(nbytes)
@@ -0,0 +1,261 @@
+"""
+Batch image encoding for the image saver nodes.
+
+A batch can be encoded sequentially, on a thread pool (PIL releases the GIL
+while encoding) or on a process pool that reads pixels from a shared memory
+block, so each worker only receives a name and an index. The batch's
+metadata is pickled once into the same block and unpickled once per worker.
+
+The process pool uses forkserver (spawn where that is unavailable), since
+forking ComfyUI's threaded process is unsafe. ComfyUI imports custom nodes
+under a name derived from their folder path, which a fresh worker cannot
+import, so each worker first registers this package under the same name.
+"""
+
+import atexit
+import io
+import logging
+import multiprocessing
+import os
+import pickle
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+import numpy as np
+from PIL import Image
+
+from .filename_allocator import removed_on_error
+from .formats import get_engine
+from .instrumentation import NULL_STATS
+
+logger = logging.getLogger(__name__)
+
+EXECUTOR_MODES = ["sequential", "threads", "processes"]
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+# Run by each process-pool worker (through exec, which a fresh interpreter can
+# always unpickle) so task functions pickled by reference resolve there
+_WORKER_BOOTSTRAP = """
+import sys, types
+if {name!r} not in sys.modules:
+    package = types.ModuleType({name!r})
+    package.__path__ = [{path!r}]
+    sys.modules[{name!r}] = package
+"""
+
+# Worker side: (shared block name, metadata list) of the batch last seen
+_worker_metadata = (None, None)
+
+
+def save_image(pixels, path, engine, metadata, options, timed=False):
+    """
+    Write a single uint8 [H, W, C] image.
+
+    Args:
+        pixels: uint8 array [H, W, C]
+        path: Output file path
+        engine: Format engine name (see formats.FORMAT_ENGINES)
+        metadata: Container metadata built by the engine's build_metadata
+        options: Encoder settings (compress_level, quality, lossless, effort)
+        timed: Encode to memory first so encode and write can be timed separately
+
+    Returns:
+        (encode_seconds, write_seconds, bytes_written) when timed, otherwise None
+    """
+    with removed_on_error(path):
+        img = Image.fromarray(pixels)
+        if not timed:
+            get_engine(engine).save(img, path, metadata, options)
+            return None
+
+        start = time.perf_counter()
+        buffer = io.BytesIO()
+        get_engine(engine).save(img, buffer, metadata, options)
+        encoded = time.perf_counter()
+        with open(path, "wb") as f:
+            f.write(buffer.getbuffer())
+        return encoded - start, time.perf_counter() - encoded, buffer.tell()
+
+
+def encode_batch(pixels, items, engine, options, mode="sequential", workers=0,
+                 stats=NULL_STATS):
+    """
+    Encode and write every item of a quantized batch.
+
+    Output names are decided by the caller, so the sequential counter naming
+    and result order are unaffected by the order in which workers finish.
+
+    Args:
+        pixels: uint8 array [B, H, W, C] from quantize_batch
+        items: List of (batch_index, path, metadata) tuples
+        engine: Format engine name
+        options: Encoder settings passed to the engine
+        mode: One of EXECUTOR_MODES
+        workers: Pool size, 0 for one worker per CPU
+        stats: SaveStats that receives per-item encode/write times and sizes
+    """
+    if mode not in EXECUTOR_MODES:
+        raise ValueError(f"Unknown executor mode: {mode}")
+
+    timed = stats.enabled
+    timings = None
+    if mode == "sequential" or len(items) < 2:
+        timings = [save_image(pixels[index], path, engine, metadata, options, timed)
+                   for index, path, metadata in items]
+    elif mode == "processes":
+        try:
+            timings = _encode_processes(pixels, items, engine, options, workers, timed)
+        except BrokenProcessPool:
+            # A worker died or could not start (e.g. it failed to import this module)
+            logger.warning("MetaSaver: process pool unavailable, falling back to threads")
+            _drop_pool("processes", workers)
+
+    if timings is None:
+        pool = _get_pool("threads", workers)
+        futures = [pool.submit(save_image, pixels[index], path, engine, metadata, options, timed)
+                   for index, path, metadata in items]
+        timings = _wait_all(futures)
+
+    if timed:
+        for encode_s, write_s, nbytes in timings:
+            stats.add_time("encode", encode_s)
+            stats.add_time("write", write_s)
+            stats.add_file(nbytes)
+
+
+def encode_image(pixels, engine, metadata, options):
+    """Encode a single uint8 [H, W, C] image in memory and return the file bytes."""
+    buffer = io.BytesIO()
+    get_engine(engine).save(Image.fromarray(pixels), buffer, metadata, options)
+    return buffer.getvalue()
+
+
+def encode_batch_to_memory(pixels, items, engine, options, mode="sequential", workers=0):
+    """
+    Encode every item of a quantized batch in memory, for writers that pack the results.
+
+    The "processes" mode uses the thread pool here, since the encoded bytes
+    would otherwise be pickled back from the workers.
+
+    Args:
+        pixels: uint8 array [B, H, W, C] from quantize_batch
+        items: List of (batch_index, metadata) tuples
+        engine: Format engine name
+        options: Encoder settings passed to the engine
+        mode: One of EXECUTOR_MODES
+        workers: Pool size, 0 for one worker per CPU
+
+    Returns:
+        List of encoded files as bytes, in item order
+    """
+    if mode not in EXECUTOR_MODES:
+        raise ValueError(f"Unknown executor mode: {mode}")
+    if mode == "sequential" or len(items) < 2:
+        return [encode_image(pixels[index], engine, metadata, options)
+                for index, metadata in items]
+    pool = _get_pool("threads", workers)
+    return _wait_all([pool.submit(encode_image, pixels[index], engine, metadata, options)
+                      for index, metadata in items])
+
+
+def _encode_processes(pixels, items, engine, options, workers, timed):
+    # The items of a batch share one metadata object; each distinct one is
+    # pickled once, behind the pixels, and tasks refer to it by position
+    distinct = {}
+    for _, _, metadata in items:
+        distinct.setdefault(id(metadata), (len(distinct), metadata))
+    blob = pickle.dumps([metadata for _, metadata in distinct.values()],
+                        protocol=pickle.HIGHEST_PROTOCOL)
+
+    shm = shared_memory.SharedMemory(create=True, size=max(1, pixels.nbytes + len(blob)))
+    try:
+        shared = np.ndarray(pixels.shape, dtype=pixels.dtype, buffer=shm.buf)
+        shared[...] = pixels
+        del shared
+        shm.buf[pixels.nbytes:pixels.nbytes + len(blob)] = blob
+        layout = (shm.name, pixels.shape, pixels.dtype.str, len(blob))
+        pool = _get_pool("processes", workers)
+        futures = [pool.submit(_save_image_shared, layout, index, path, engine,
+                               distinct[id(metadata)][0], options, timed)
+                   for index, path, metadata in items]
+        return _wait_all(futures)
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def _save_image_shared(layout, index, path, engine, metadata_index, options, timed):
+    """Process-pool entry point: encode one image straight from shared memory."""
+    global _worker_metadata
+
+    shm_name, shape, dtype, metadata_size = layout
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        batch = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+        if _worker_metadata[0] != shm_name:
+            offset = batch.nbytes
+            _worker_metadata = (shm_name, pickle.loads(shm.buf[offset:offset + metadata_size]))
+        metadata = _worker_metadata[1][metadata_index]
+        result = save_image(batch[index], path, engine, metadata, options, timed)
+        del batch
+        return result
+    finally:
+        shm.close()
+
+
+def _wait_all(futures):
+    """Wait for every future and return their results, re-raising the first failure."""
+    results = []
+    first_error = None
+    for future in futures:
+        try:
+            results.append(future.result())
+        except Exception as e:
+            if first_error is None:
+                first_error = e
+    if first_error is not None:
+        raise first_error
+    return results
+
+
+def _get_pool(mode, workers):
+    workers = workers or os.cpu_count() or 1
+    with _pools_lock:
+        pool = _pools.get((mode, workers))
+        if pool is None:
+            if mode == "processes":
+                package = __name__.rpartition(".")[0]
+                bootstrap = _WORKER_BOOTSTRAP.format(
+                    name=package, path=os.path.dirname(os.path.abspath(__file__)))
+                methods = multiprocessing.get_all_start_methods()
+                start_method = "forkserver" if "forkserver" in methods else "spawn"
+                pool = ProcessPoolExecutor(max_workers=workers,
+                                           mp_context=multiprocessing.get_context(start_method),
+                                           initializer=exec, initargs=(bootstrap, {}))
+            else:
+                pool = ThreadPoolExecutor(max_workers=workers,
+                                          thread_name_prefix="MetaSaver-encode")
+            _pools[(mode, workers)] = pool
+        return pool
+
+
+def _drop_pool(mode, workers):
+    workers = workers or os.cpu_count() or 1
+    with _pools_lock:
+        pool = _pools.pop((mode, workers), None)
+    if pool is not None:
+        pool.shutdown(wait=False)
+
+
+@atexit.register
+def _shutdown_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.shutdown(wait=True)
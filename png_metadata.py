@@ -0,0 +1,172 @@
+"""
+PNG metadata serialization shared by the image saver nodes.
+
+Workflow metadata is identical for every image in a batch and usually across
+consecutive runs of the same workflow. It is serialized once per batch (with
+orjson when available), and the encoded chunks (which may be
+zlib-compressed) are kept in a small LRU keyed by a hash of their text, so a
+repeat run with an identical workflow skips building and compressing them.
+
+Large entries (the workflow JSON) can optionally be stored as zlib-compressed
+zTXt/iTXt chunks, while small per-field entries stay plain tEXt so they remain
+cheap to read.
+"""
+
+import codecs
+import hashlib
+import json
+import marshal
+import re
+import threading
+from collections import OrderedDict
+
+from PIL.PngImagePlugin import PngInfo
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _json_escape(error):
+    # Encode error handler writing unencodable characters as JSON \u escapes
+    escaped = []
+    for char in error.object[error.start:error.end]:
+        cp = ord(char)
+        if cp > 0xFFFF:
+            cp -= 0x10000
+            escaped.append("\\u%04x\\u%04x" % (0xD800 + (cp >> 10), 0xDC00 + (cp & 0x3FF)))
+        else:
+            escaped.append("\\u%04x" % cp)
+    return "".join(escaped), error.end
+
+
+codecs.register_error("metasaver.json_escape", _json_escape)
+
+
+def ascii_json(text):
+    """Escape the non-ASCII characters of a JSON document the way ensure_ascii does."""
+    if text.isascii():
+        return text
+    return text.encode("ascii", "metasaver.json_escape").decode("ascii")
+
+
+# A marshalled float: type code (with or without the back-reference flag), then
+# 8 little-endian IEEE bytes whose exponent bits are all ones for NaN and the
+# infinities. One pattern per type code: a literal first byte searches much faster
+_NON_FINITE_FLOATS = tuple(re.compile(code + rb"[\x00-\xff]{6}[\xf0-\xff][\x7f\xff]", re.S)
+                           for code in (b"g", b"\xe7"))
+
+
+def _has_non_finite(value):
+    """
+    Return True if a JSON-compatible value may contain a NaN or infinite float.
+
+    marshal writes every float as its IEEE bytes, so the check runs at C
+    speed. A string that happens to contain the same byte pattern only costs
+    a needless stdlib fallback.
+    """
+    try:
+        data = marshal.dumps(value)
+    except ValueError:
+        # Types marshal does not know (orjson also takes e.g. dataclasses)
+        return True
+    return any(pattern.search(data) for pattern in _NON_FINITE_FLOATS)
+
+
+def dumps_json(value, indent=False):
+    """
+    Serialize value to ASCII-escaped JSON, using orjson when it is installed.
+
+    orjson's output is escaped to ASCII afterwards, so it always fits a tEXt
+    chunk. orjson writes NaN and Infinity as null, so values holding them
+    (and anything else orjson rejects) go through the stdlib instead, which
+    keeps them. Output is compact unless indented.
+
+    Args:
+        value: JSON-compatible value
+        indent: Indent by two spaces
+    """
+    if orjson is not None:
+        try:
+            text = orjson.dumps(value, option=orjson.OPT_INDENT_2 if indent else 0)
+        except TypeError:
+            pass
+        else:
+            # Only a null in the output can stand for a NaN/Infinity
+            if b"null" not in text or not _has_non_finite(value):
+                return ascii_json(text.decode("utf-8"))
+    return json.dumps(value, indent=2 if indent else None,
+                      separators=None if indent else (",", ":"))
+
+
+class PngMetadataCache:
+    """
+    LRU of encoded PNG text chunks keyed by a hash of their entries.
+
+    The key is computed from the already serialized text, so a hit saves
+    building and compressing the chunks, not the JSON encoding.
+
+    The returned PngInfo objects share cached chunk bytes, so callers must
+    treat them as read-only.
+    """
+
+    def __init__(self, max_entries=8):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_pnginfo(self, entries, zip_threshold=None):
+        """
+        Return a PngInfo holding one text chunk per entry.
+
+        Args:
+            entries: Iterable of (key, text, compressible) tuples in chunk order
+            zip_threshold: Compress compressible entries whose text is at least
+                this many characters; None keeps every chunk uncompressed
+        """
+        entries = [(key, text, compressible and zip_threshold is not None
+                    and len(text) >= zip_threshold)
+                   for key, text, compressible in entries]
+        digest = self._digest(entries)
+
+        with self._lock:
+            chunks = self._entries.get(digest)
+            if chunks is not None:
+                self._entries.move_to_end(digest)
+
+        if chunks is None:
+            info = PngInfo()
+            for key, text, zip in entries:
+                info.add_text(key, text, zip=zip)
+            chunks = info.chunks
+            with self._lock:
+                self._entries[digest] = chunks
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+
+        metadata = PngInfo()
+        metadata.chunks = chunks
+        return metadata
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    @staticmethod
+    def _digest(entries):
+        h = hashlib.blake2b(digest_size=16)
+        for key, text, zip in entries:
+            h.update(b"z" if zip else b"t")
+            for part in (key.encode("utf-8"), text.encode("utf-8")):
+                h.update(len(part).to_bytes(8, "little"))
+                h.update(part)
+        return h.digest()
+
+
+_metadata_cache = PngMetadataCache()
+
+
+def build_pnginfo(entries, zip_threshold=None):
+    """Build (or reuse) the PngInfo for a list of (key, text, compressible) entries."""
+    return _metadata_cache.get_pnginfo(entries, zip_threshold)
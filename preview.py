@@ -0,0 +1,75 @@
+"""
+Downscaled previews for the ComfyUI frontend.
+
+The ui result of a save normally points the browser at the full-resolution
+files. With previews enabled, each image is also written as a small,
+fast-encoded file in ComfyUI's temp directory, and the ui result references
+those instead. Previews are made from the pixels the save already has in
+memory: the quantized batch, or the tensor itself for streamed images, read
+with a stride so only about twice the preview size is ever converted.
+"""
+
+import os
+import random
+import string
+
+from PIL import Image
+
+from .image_convert import quantize_batch
+
+PREVIEW_FORMATS = ["webp", "jpeg", "png"]
+
+_EXTENSIONS = {"webp": "webp", "jpeg": "jpg", "png": "png"}
+
+
+def preview_image(pixels, max_size, quantized=True):
+    """
+    Downscale one image so its longest edge is at most max_size.
+
+    Args:
+        pixels: uint8 array [H, W, C], or an IMAGE tensor [H, W, C] when not quantized
+        max_size: Longest edge of the preview in pixels
+        quantized: Whether pixels is already uint8
+    """
+    height, width = pixels.shape[0], pixels.shape[1]
+    # Subsample to about twice the target first; the resize below smooths the rest
+    step = max(1, max(height, width) // (2 * max_size))
+    sample = pixels[::step, ::step]
+    if not quantized:
+        sample = quantize_batch(sample)
+    if sample.shape[2] == 1:
+        sample = sample[:, :, 0]
+    img = Image.fromarray(sample)
+    img.thumbnail((max_size, max_size), Image.BILINEAR)
+    return img
+
+
+def write_previews(pixels, counters, filename, temp_dir, max_size, fmt="webp", quantized=True):
+    """
+    Write a preview of every image in a batch and return their ui entries.
+
+    Args:
+        pixels: uint8 array [B, H, W, C], or the IMAGE tensor when not quantized
+        counters: Counter of each image's full-resolution file, for the names
+        filename: Filename part of the save prefix
+        temp_dir: ComfyUI temp directory
+        max_size: Longest edge of the previews in pixels
+        fmt: Preview format (see PREVIEW_FORMATS)
+        quantized: Whether pixels is already uint8
+    """
+    os.makedirs(temp_dir, exist_ok=True)
+    # The temp directory is shared by every output folder; a random part keeps names apart
+    token = "".join(random.choice(string.ascii_lowercase) for _ in range(5))
+    results = []
+    for batch_number, counter in enumerate(counters):
+        img = preview_image(pixels[batch_number], max_size, quantized)
+        file = f"{filename}_temp_{token}_{counter:05}_.{_EXTENSIONS[fmt]}"
+        path = os.path.join(temp_dir, file)
+        if fmt == "webp":
+            img.save(path, format="WEBP", quality=80, method=0)
+        elif fmt == "jpeg":
+            img.convert("RGB").save(path, format="JPEG", quality=80)
+        else:
+            img.save(path, format="PNG", compress_level=1)
+        results.append({"filename": file, "subfolder": "", "type": "temp"})
+    return results
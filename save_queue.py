@@ -0,0 +1,118 @@
+"""
+Background save queue used by the image saver nodes.
+
+When async saving is enabled the node only computes filenames and metadata on
+the ComfyUI executor thread; tensor conversion, PNG encoding and the disk write
+are handed to a small pool of worker threads through a bounded queue.
+"""
+
+import atexit
+import logging
+import queue
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundSaveError(RuntimeError):
+    """Raised on the executor thread when earlier background saves failed."""
+
+
+class BackgroundSaveQueue:
+    """
+    Bounded worker-thread queue for save jobs.
+
+    submit() blocks while the queue is full, which applies backpressure to the
+    executor instead of letting pending tensors pile up in memory. Failed jobs
+    are logged immediately and reported again by raise_errors() so the next
+    node call can surface them in the ComfyUI UI.
+    """
+
+    def __init__(self, max_pending=8, workers=1):
+        self._queue = queue.Queue(maxsize=max(1, max_pending))
+        self._errors = []
+        self._errors_lock = threading.Lock()
+        self._threads = []
+        self._closed = False
+        for n in range(max(1, workers)):
+            thread = threading.Thread(target=self._worker, name=f"MetaSaver-save-{n}",
+                                      daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, description, fn, *args, **kwargs):
+        """
+        Queue fn(*args, **kwargs) for execution on a worker thread.
+
+        Args:
+            description: Short label (usually the output filename) used in error reports
+            fn: Callable performing the save
+        """
+        if self._closed:
+            raise BackgroundSaveError("Background save queue has been shut down")
+        self._queue.put((description, fn, args, kwargs))
+
+    def pending(self):
+        """Number of queued or running jobs."""
+        return self._queue.unfinished_tasks
+
+    def flush(self):
+        """Block until every queued job has finished."""
+        self._queue.join()
+
+    def raise_errors(self):
+        """Raise BackgroundSaveError if any job failed since the last call."""
+        with self._errors_lock:
+            errors, self._errors = self._errors, []
+        if errors:
+            details = "; ".join(f"{desc}: {err}" for desc, err in errors[:5])
+            if len(errors) > 5:
+                details += f"; ... and {len(errors) - 5} more"
+            raise BackgroundSaveError(f"{len(errors)} background save(s) failed: {details}")
+
+    def shutdown(self):
+        """Flush pending jobs and stop the worker threads."""
+        if self._closed:
+            return
+        self.flush()
+        self._closed = True
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                description, fn, args, kwargs = job
+                try:
+                    fn(*args, **kwargs)
+                except Exception as e:
+                    logger.exception("MetaSaver: background save failed for %s", description)
+                    with self._errors_lock:
+                        self._errors.append((description, e))
+            finally:
+                self._queue.task_done()
+
+
+_save_queue = None
+_save_queue_lock = threading.Lock()
+
+
+def get_save_queue():
+    """Return the process-wide save queue, creating it on first use."""
+    global _save_queue
+    with _save_queue_lock:
+        if _save_queue is None:
+            _save_queue = BackgroundSaveQueue(max_pending=4)
+            atexit.register(_save_queue.shutdown)
+        return _save_queue
+
+
+def raise_background_errors():
+    """Report failed background saves, if the queue has ever been used."""
+    if _save_queue is not None:
+        _save_queue.raise_errors()
@@ -0,0 +1,74 @@
+"""
+Optional nested directory layouts for large output folders.
+
+With sharding on, each saved file goes into a subfolder of the prefix's
+output folder instead of the folder itself:
+
+    counter: one folder per shard_size counters, e.g. "shard_00012" for
+             counters 12000-12999 with the default size of 1000
+    hash:    two levels named by the first bytes of a hash of the file's base
+             name, e.g. "shard_3f/a2", spreading files evenly over 65536 folders
+
+The hash covers "{prefix}_{counter:05}_" only, so a file's shard can be
+computed from its name alone, whatever its extension.
+
+Shard folders at the top level carry a "shard_" prefix so they cannot be
+mistaken for user subfolders such as dated folders ("20241017") or short
+names ("ab").
+"""
+
+import hashlib
+import os
+import re
+
+SHARD_LAYOUTS = ["off", "counter", "hash"]
+
+SHARD_PREFIX = "shard_"
+COUNTER_SHARD = re.compile(r"^shard_\d{5,}$")
+HASH_SHARD = re.compile(r"^shard_[0-9a-f]{2}$")
+HASH_SUBSHARD = re.compile(r"^[0-9a-f]{2}$")
+OUTPUT_NAME = re.compile(r"^(?P<prefix>.+)_(?P<counter>\d+)_\.(?P<ext>\w+)$")
+
+
+def shard_subfolder(layout, filename, counter, shard_size=1000):
+    """
+    Return the shard folder, relative to the prefix's folder, for one output.
+
+    Args:
+        layout: One of SHARD_LAYOUTS
+        filename: Base filename from the prefix
+        counter: The output's counter
+        shard_size: Counters per folder for the counter layout
+    """
+    if layout == "counter":
+        return f"{SHARD_PREFIX}{counter // max(1, shard_size):05}"
+    if layout == "hash":
+        digest = hashlib.blake2b(f"{filename}_{counter:05}_".encode("utf-8"),
+                                 digest_size=2).hexdigest()
+        return os.path.join(SHARD_PREFIX + digest[:2], digest[2:])
+    return ""
+
+
+def shard_folders(folder, layout):
+    """
+    Return the existing shard folders of a layout under folder.
+
+    Only folders named the way the layout names them are returned, so user
+    subfolders next to the shards are left alone.
+    """
+    try:
+        entries = [entry.name for entry in os.scandir(folder) if entry.is_dir()]
+    except FileNotFoundError:
+        return []
+    if layout == "counter":
+        return sorted((os.path.join(folder, name) for name in entries
+                       if COUNTER_SHARD.match(name)),
+                      key=lambda path: int(os.path.basename(path)[len(SHARD_PREFIX):]))
+    if layout == "hash":
+        shards = []
+        for top in sorted(name for name in entries if HASH_SHARD.match(name)):
+            top_path = os.path.join(folder, top)
+            shards += [os.path.join(top_path, entry.name) for entry in os.scandir(top_path)
+                       if entry.is_dir() and HASH_SUBSHARD.match(entry.name)]
+        return shards
+    return []
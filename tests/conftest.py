@@ -0,0 +1,66 @@
+"""
+Shared test setup.
+
+The repository is loaded as the package "metasaver", the way ComfyUI loads a
+custom node folder. ComfyUI's folder_paths module is replaced by a minimal
+one whose output and temp directories live under pytest's tmp_path.
+"""
+
+import importlib.util
+import os
+import sys
+import types
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_dirs = {}
+
+
+def _get_save_image_path(filename_prefix, output_dir, image_width=0, image_height=0):
+    # Same contract as ComfyUI's folder_paths.get_save_image_path
+    subfolder = os.path.dirname(os.path.normpath(filename_prefix))
+    filename = os.path.basename(os.path.normpath(filename_prefix))
+    full_output_folder = os.path.join(output_dir, subfolder)
+    os.makedirs(full_output_folder, exist_ok=True)
+    return full_output_folder, filename, 1, subfolder, filename_prefix
+
+
+def _install_folder_paths():
+    module = types.ModuleType("folder_paths")
+    module.get_output_directory = lambda: _dirs["output"]
+    module.get_temp_directory = lambda: _dirs["temp"]
+    module.get_save_image_path = _get_save_image_path
+    sys.modules["folder_paths"] = module
+
+
+# Installed at import time: pytest imports the repository's own __init__.py
+# while collecting, before any fixture runs
+_install_folder_paths()
+
+
+def _load_package():
+    if "metasaver" in sys.modules:
+        return sys.modules["metasaver"]
+    spec = importlib.util.spec_from_file_location(
+        "metasaver", os.path.join(ROOT, "__init__.py"), submodule_search_locations=[ROOT])
+    package = importlib.util.module_from_spec(spec)
+    sys.modules["metasaver"] = package
+    spec.loader.exec_module(package)
+    return package
+
+
+@pytest.fixture
+def output_dir(tmp_path):
+    """Point folder_paths at fresh output and temp directories."""
+    _dirs["output"] = str(tmp_path / "output")
+    _dirs["temp"] = str(tmp_path / "temp")
+    os.makedirs(_dirs["output"])
+    os.makedirs(_dirs["temp"])
+    return _dirs["output"]
+
+
+@pytest.fixture
+def metasaver():
+    return _load_package()
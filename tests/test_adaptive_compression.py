@@ -0,0 +1,22 @@
+def test_large_batch_steps_down_after_fast_small_ones(metasaver):
+    controller = metasaver.adaptive_compression.AdaptiveCompression()
+    small, large = 512 * 512 * 3, 4096 * 4096 * 3
+
+    assert controller.choose(1, 9, 100, small) == 9
+    # 40 ms for a small image: fine for another small one
+    controller.record(9, 0.040, small)
+    assert controller.choose(1, 9, 100, small) == 9
+    # At the same throughput a 64x larger image would take about 2.5 s
+    controller.record(9, 0.040, small)
+    assert controller.choose(1, 9, 100, large) == 8
+
+
+def test_steps_up_when_expected_time_is_well_inside_target(metasaver):
+    controller = metasaver.adaptive_compression.AdaptiveCompression()
+    nbytes = 512 * 512 * 3
+
+    controller.choose(1, 9, 100, nbytes)
+    controller.record(9, 0.5, nbytes)
+    assert controller.choose(1, 9, 100, nbytes) == 8
+    controller.record(8, 0.010, nbytes)
+    assert controller.choose(1, 9, 100, nbytes) == 9
@@ -0,0 +1,43 @@
+import os
+
+import numpy as np
+import pytest
+
+
+def _images(count=2):
+    return np.random.rand(count, 8, 8, 3).astype(np.float32)
+
+
+def test_failed_background_save_does_not_drop_the_next_batch(metasaver, output_dir,
+                                                             monkeypatch):
+    node_module = metasaver.meta_saver_node
+    encode_batch = node_module.encode_batch
+    calls = []
+
+    def failing_once(*args, **kwargs):
+        calls.append(args)
+        if len(calls) == 1:
+            raise OSError("disk full")
+        return encode_batch(*args, **kwargs)
+
+    monkeypatch.setattr(node_module, "encode_batch", failing_once)
+    node = node_module.MetaSaverNode()
+    save_queue = metasaver.save_queue.get_save_queue()
+
+    node.save_images(_images(), "bg/first", async_save=True)
+    save_queue.flush()
+
+    # The earlier failure is still reported, but only after this batch is queued
+    with pytest.raises(metasaver.save_queue.BackgroundSaveError, match="disk full"):
+        node.save_images(_images(), "bg/second", async_save=True)
+    save_queue.flush()
+
+    saved = sorted(os.listdir(os.path.join(output_dir, "bg")))
+    assert saved == ["second_00001_.png", "second_00002_.png"]
+    for name in saved:
+        assert os.path.getsize(os.path.join(output_dir, "bg", name)) > 0
+
+    # Reported once, the next save goes through without an error
+    node.save_images(_images(1), "bg/third", async_save=True)
+    save_queue.flush()
+    assert "third_00001_.png" in os.listdir(os.path.join(output_dir, "bg"))
@@ -0,0 +1,25 @@
+import tracemalloc
+
+
+def test_memory_peak_is_reported_for_a_save_on_its_own(metasaver):
+    stats = metasaver.instrumentation.SaveStats("Node", trace_memory=True)
+    buffer = bytearray(1 << 20)
+    record = stats.finish()
+    del buffer
+
+    assert record["peak_traced_bytes"] >= 1 << 20
+    assert not tracemalloc.is_tracing()
+
+
+def test_overlapping_saves_get_no_memory_peak(metasaver):
+    first = metasaver.instrumentation.SaveStats("Node", trace_memory=True)
+    second = metasaver.instrumentation.SaveStats("Node", trace_memory=True)
+
+    # The first save to finish must not stop tracing under the second one
+    assert "peak_traced_bytes" not in first.finish()
+    assert tracemalloc.is_tracing()
+    assert "peak_traced_bytes" not in second.finish()
+    assert not tracemalloc.is_tracing()
+
+    assert "peak_traced_bytes" in metasaver.instrumentation.SaveStats(
+        "Node", trace_memory=True).finish()
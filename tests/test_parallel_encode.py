@@ -0,0 +1,19 @@
+import numpy as np
+from PIL import Image
+
+
+def test_process_pool_encodes_each_batch_with_its_own_metadata(metasaver, tmp_path):
+    parallel_encode = metasaver.parallel_encode
+    build_pnginfo = metasaver.png_metadata.build_pnginfo
+    pixels = np.random.randint(0, 255, (3, 16, 16, 3), dtype=np.uint8)
+
+    for run in ("first", "second"):
+        metadata = build_pnginfo([("workflow", f'{{"run":"{run}"}}', True)])
+        items = [(n, str(tmp_path / f"{run}_{n}.png"), metadata) for n in range(len(pixels))]
+        parallel_encode.encode_batch(pixels, items, "png", {"compress_level": 1},
+                                     mode="processes", workers=2)
+
+        for n, path, _ in items:
+            with Image.open(path) as img:
+                assert img.text["workflow"] == f'{{"run":"{run}"}}'
+                assert np.array_equal(np.asarray(img), pixels[n])
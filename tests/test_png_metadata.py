@@ -0,0 +1,35 @@
+import json
+import math
+
+import pytest
+
+
+@pytest.mark.parametrize("indent", [False, True])
+def test_dumps_json_matches_stdlib_ascii_output(metasaver, indent):
+    value = {"nodes": [{"links": None, "title": "café ☃ 😀", "size": [315, 262.5]}],
+             "extra": {"flag": True}}
+    expected = json.dumps(value, indent=2 if indent else None,
+                          separators=None if indent else (",", ":"))
+
+    text = metasaver.png_metadata.dumps_json(value, indent)
+
+    assert text.isascii()
+    assert json.loads(text) == value
+    if not indent:
+        assert text == expected
+
+
+def test_dumps_json_keeps_nan_and_infinity_next_to_null(metasaver):
+    text = metasaver.png_metadata.dumps_json({"links": None, "cfg": [math.nan, -math.inf]})
+
+    value = json.loads(text)
+    assert value["links"] is None
+    assert math.isnan(value["cfg"][0]) and value["cfg"][1] == -math.inf
+
+
+def test_dumps_json_sees_in_place_edits(metasaver):
+    workflow = {"a": {"b": 1}}
+    metasaver.png_metadata.dumps_json(workflow)
+    workflow["a"]["b"] = 2
+
+    assert json.loads(metasaver.png_metadata.dumps_json(workflow)) == {"a": {"b": 2}}
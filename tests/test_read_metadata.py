@@ -0,0 +1,54 @@
+import hashlib
+import json
+import os
+import sqlite3
+
+import pytest
+from PIL import Image, PngImagePlugin
+
+EXAMPLES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "examples")
+
+
+@pytest.fixture
+def read_metadata(monkeypatch):
+    monkeypatch.syspath_prepend(EXAMPLES)
+    import read_metadata
+    return read_metadata
+
+
+def _cached_paths(directory):
+    conn = sqlite3.connect(os.path.join(directory, ".metasaver_scan_cache.sqlite"))
+    try:
+        return {path for path, in conn.execute("SELECT path FROM files")}
+    finally:
+        conn.close()
+
+
+def test_incremental_export_prunes_deleted_unreadable_files(read_metadata, tmp_path):
+    Image.new("RGB", (8, 8)).save(tmp_path / "good.png")
+    (tmp_path / "broken.png").write_bytes(b"not a png")
+
+    read_metadata.export_metadata_incremental(str(tmp_path), workers=0)
+    assert _cached_paths(tmp_path) == {"good.png", "broken.png"}
+
+    os.remove(tmp_path / "broken.png")
+    read_metadata.export_metadata_incremental(str(tmp_path), workers=0)
+    assert _cached_paths(tmp_path) == {"good.png"}
+
+
+def test_incremental_export_resolves_sidecars(read_metadata, tmp_path):
+    prompt = json.dumps({"1": {"class_type": "KSampler"}})
+    digest = hashlib.sha256(prompt.encode()).hexdigest()
+    sidecar = tmp_path / ".metasaver_objects" / "workflows" / digest[:2] / f"{digest}.json"
+    sidecar.parent.mkdir(parents=True)
+    sidecar.write_text(prompt, encoding="utf-8")
+
+    info = PngImagePlugin.PngInfo()
+    info.add_text("prompt_ref", digest)
+    Image.new("RGB", (8, 8)).save(tmp_path / "image.png", pnginfo=info)
+
+    read_metadata.export_metadata_incremental(str(tmp_path), workers=0)
+
+    with open(tmp_path / "metadata_export.json", encoding="utf-8") as f:
+        exported = json.load(f)
+    assert exported["image.png"] == {"prompt": {"1": {"class_type": "KSampler"}}}
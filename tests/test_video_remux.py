@@ -0,0 +1,52 @@
+import json
+
+import numpy as np
+import pytest
+
+av = pytest.importorskip("av")
+
+
+def _write_video(path, tags):
+    with av.open(str(path), mode="w", format="mp4",
+                 options={"movflags": "use_metadata_tags"}) as container:
+        for key, value in tags.items():
+            container.metadata[key] = value
+        stream = container.add_stream("mpeg4", rate=5)
+        stream.width = stream.height = 32
+        frame = av.VideoFrame.from_ndarray(np.zeros((32, 32, 3), np.uint8), format="rgb24")
+        for packet in stream.encode(frame):
+            container.mux(packet)
+        for packet in stream.encode():
+            container.mux(packet)
+
+
+def _custom_tags(path):
+    with av.open(str(path)) as container:
+        return {key: value for key, value in container.metadata.items()
+                if key == "custom_metadata" or "seed" in key}
+
+
+def test_remux_meta_tags_to_bare(metasaver, tmp_path):
+    path = tmp_path / "clip.mp4"
+    _write_video(path, {"custom_metadata": json.dumps({"seed": 42}),
+                        "meta_seed": json.dumps("42")})
+
+    metasaver.video_remux.remux_metadata(str(path), {"seed": 99}, field_prefix="")
+
+    tags = _custom_tags(path)
+    assert "meta_seed" not in tags
+    assert json.loads(tags["seed"]) == "99"
+    assert json.loads(tags["custom_metadata"]) == {"seed": 99}
+
+
+def test_remux_bare_tags_to_meta(metasaver, tmp_path):
+    path = tmp_path / "clip.mp4"
+    _write_video(path, {"custom_metadata": json.dumps({"seed": 42}),
+                        "seed": json.dumps("42")})
+
+    metasaver.video_remux.remux_metadata(str(path), {"seed": 99}, field_prefix="meta_")
+
+    tags = _custom_tags(path)
+    assert "seed" not in tags
+    assert json.loads(tags["meta_seed"]) == "99"
+    assert json.loads(tags["custom_metadata"]) == {"seed": 99}
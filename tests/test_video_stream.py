@@ -0,0 +1,25 @@
+import os
+import sqlite3
+
+import numpy as np
+import pytest
+
+av = pytest.importorskip("av")
+
+
+def test_index_records_the_encoded_size_of_odd_frames(metasaver, output_dir):
+    frames = np.random.rand(4, 33, 49, 3).astype(np.float32)
+
+    result = metasaver.meta_saver_node.MetaVideoStreamSaverNode().save_video(
+        frames, 8.0, "clips/odd", preset="ultrafast", index_metadata=True)
+    index_path = metasaver.metadata_index.default_index_path(output_dir)
+    metasaver.metadata_index.get_index(index_path).flush()
+
+    video = result["ui"]["videos"][0]
+    with av.open(os.path.join(output_dir, video["subfolder"], video["filename"])) as container:
+        stream = container.streams.video[0]
+        encoded = (stream.codec_context.width, stream.codec_context.height)
+    with sqlite3.connect(index_path) as conn:
+        indexed = conn.execute("SELECT width, height FROM outputs").fetchone()
+    assert encoded == (48, 32)
+    assert indexed == encoded
@@ -0,0 +1,147 @@
+"""
+Rewrite the metadata tags of an existing video without re-encoding it.
+
+remux_metadata copies every packet of the source into a new container with
+the updated tags (a stream copy), so it costs about as much as copying the
+file. Tags are stored as JSON values the way VIDEO.save_to and the MetaSaver
+video nodes store them, and new custom fields are merged into an existing
+custom_metadata tag unless replace is set.
+
+PyAV is imported on first use; it ships with ComfyUI.
+"""
+
+import json
+import os
+import threading
+
+# Tags the muxer writes itself; copying them over would only duplicate them
+MUXER_TAGS = ("major_brand", "minor_version", "compatible_brands", "encoder")
+
+# Muxer for each output extension (the temporary file has no usable extension)
+MUXERS = {".mp4": "mp4", ".m4v": "mp4", ".mov": "mov", ".webm": "webm", ".mkv": "matroska"}
+
+
+def existing_custom_metadata(tags):
+    """Return the custom_metadata dict stored in a file's tags, or {}."""
+    try:
+        value = json.loads(tags.get("custom_metadata", "{}"))
+    except json.JSONDecodeError:
+        return {}
+    return value if isinstance(value, dict) else {}
+
+
+def detect_field_prefix(tags, default="meta_"):
+    """
+    Return the per-field tag prefix a file already uses.
+
+    MetaVideoSaverNode writes bare field tags and the other video nodes
+    "meta_" ones. Files without custom fields get the default.
+
+    Args:
+        tags: Tags already in the file (values as stored, i.e. JSON text)
+        default: Prefix to use when the file has no per-field tags
+    """
+    for key in existing_custom_metadata(tags):
+        if f"meta_{key}" in tags:
+            return "meta_"
+        if key in tags:
+            return ""
+    return default
+
+
+def custom_metadata_tags(custom_metadata, existing=None, replace=False, field_prefix="meta_"):
+    """
+    Build the container tags for a set of custom fields.
+
+    Args:
+        custom_metadata: Dict of field name to value
+        existing: Tags already in the file (values as stored, i.e. JSON text)
+        replace: Drop the existing custom fields instead of merging into them
+        field_prefix: Prefix of the per-field tags
+    """
+    tags = {}
+    merged = {} if replace or not existing else existing_custom_metadata(existing)
+    merged.update(custom_metadata)
+    if merged:
+        tags["custom_metadata"] = json.dumps(merged)
+        for key, value in merged.items():
+            tags[f"{field_prefix}{key}"] = json.dumps(str(value))
+    return tags
+
+
+def probe_video(path):
+    """
+    Return (tags, width, height) of a video, reading only its headers.
+
+    Args:
+        path: Video file path
+    """
+    import av
+
+    with av.open(path) as container:
+        tags = dict(container.metadata)
+        stream = container.streams.video[0] if container.streams.video else None
+        if stream is None:
+            return tags, None, None
+        return tags, stream.codec_context.width, stream.codec_context.height
+
+
+def remux_metadata(src, custom_metadata, dst=None, replace=False, field_prefix="meta_"):
+    """
+    Copy a video with updated custom metadata tags, without re-encoding.
+
+    Returns the path written. With dst None the source is replaced atomically.
+
+    Args:
+        src: Source video path
+        custom_metadata: Dict of custom fields to set
+        dst: Destination path (default: rewrite src in place)
+        replace: Drop custom fields already in the file instead of merging
+        field_prefix: Prefix of the per-field tags ("meta_", or "" for the
+            tags MetaVideoSaverNode writes); None keeps the file's own convention
+    """
+    import av
+
+    target = dst or src
+    tmp = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with av.open(src) as source:
+            existing = dict(source.metadata)
+            if field_prefix is None:
+                field_prefix = detect_field_prefix(existing)
+            # Drop the old custom tags; the merged set is written back below
+            stale = {"custom_metadata"}
+            for key in existing_custom_metadata(existing):
+                # MetaVideoSaverNode writes bare field tags, the other nodes "meta_" ones;
+                # drop both so switching styles leaves no conflicting copy behind
+                stale.update((key, f"meta_{key}", f"{field_prefix}{key}"))
+            tags = {key: value for key, value in existing.items()
+                    if key not in MUXER_TAGS and key not in stale}
+            tags.update(custom_metadata_tags(custom_metadata, existing, replace, field_prefix))
+
+            container_format = MUXERS.get(os.path.splitext(target)[1].lower(),
+                                          source.format.name.split(",")[0])
+            options = {"movflags": "use_metadata_tags"} if container_format in ("mp4", "mov") else {}
+            with av.open(tmp, mode="w", format=container_format, options=options) as output:
+                for key, value in tags.items():
+                    output.metadata[key] = value
+                streams = {}
+                for stream in source.streams:
+                    if stream.type not in ("video", "audio", "subtitle"):
+                        continue
+                    if hasattr(output, "add_stream_from_template"):
+                        streams[stream.index] = output.add_stream_from_template(stream)
+                    else:
+                        streams[stream.index] = output.add_stream(template=stream)
+
+                for packet in source.demux([source.streams[i] for i in streams]):
+                    # Flush packets carry no data
+                    if packet.dts is None:
+                        continue
+                    packet.stream = streams[packet.stream.index]
+                    output.mux(packet)
+        os.replace(tmp, target)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return target
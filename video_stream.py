@@ -0,0 +1,77 @@
+"""
+Chunked video encoding straight from IMAGE tensors.
+
+ComfyUI's VIDEO.save_to converts and encodes a finished frame sequence in
+one go. encode_images instead quantizes a few frames at a time on the
+tensor's device, encodes them with PyAV and drops them before the next
+chunk. The extra memory is one chunk of uint8 frames plus the encoder's
+lookahead, whatever the clip's length. Container tags are written the way
+save_to writes them (JSON values, use_metadata_tags for MP4), so readers
+see the same metadata as with the VIDEO saver nodes.
+
+PyAV is imported on first use; it ships with ComfyUI.
+"""
+
+import json
+from fractions import Fraction
+
+import numpy as np
+
+from .image_convert import quantize_batch
+from .instrumentation import NULL_STATS
+
+VIDEO_CODECS = ["h264", "hevc"]
+X264_PRESETS = ["ultrafast", "superfast", "veryfast", "faster", "fast",
+                "medium", "slow", "slower", "veryslow"]
+
+
+def encode_images(images, path, fps, metadata=None, codec="h264", crf=23, preset="medium",
+                  threads=0, chunk_frames=16, stats=NULL_STATS):
+    """
+    Encode an IMAGE batch to an MP4 file chunk by chunk.
+
+    Odd widths or heights are cropped by one pixel, since yuv420p needs even
+    dimensions. Returns the (width, height) that was encoded.
+
+    Args:
+        images: Tensor of frames [N, H, W, C] with values in 0-1
+        path: Output file path
+        fps: Frame rate
+        metadata: Dict of container tags; values are stored as JSON
+        codec: Video codec (h264 or hevc)
+        crf: Constant rate factor (lower = better quality, bigger file)
+        preset: x264/x265 speed preset
+        threads: Encoder threads (0 = automatic)
+        chunk_frames: Frames quantized and converted at a time
+        stats: SaveStats for this call
+    """
+    import av
+
+    height, width = images.shape[1] & ~1, images.shape[2] & ~1
+    with av.open(path, mode="w", format="mp4", options={"movflags": "use_metadata_tags"}) as output:
+        if metadata:
+            for key, value in metadata.items():
+                output.metadata[key] = json.dumps(value)
+
+        stream = output.add_stream(codec, rate=Fraction(round(fps * 1000), 1000),
+                                   options={"crf": str(crf), "preset": preset})
+        stream.width = width
+        stream.height = height
+        stream.pix_fmt = "yuv420p"
+        stream.codec_context.thread_count = threads
+        stream.codec_context.thread_type = "AUTO"
+
+        for start in range(0, len(images), max(1, chunk_frames)):
+            with stats.stage("convert"):
+                frames = quantize_batch(images[start:start + chunk_frames])
+            with stats.stage("encode"):
+                if frames.shape[1:3] != (height, width) or frames.shape[3] != 3:
+                    frames = np.ascontiguousarray(frames[:, :height, :width, :3])
+                for pixels in frames:
+                    frame = av.VideoFrame.from_ndarray(pixels, format="rgb24")
+                    output.mux(stream.encode(frame.reformat(format="yuv420p")))
+            del frames
+
+        with stats.stage("encode"):
+            output.mux(stream.encode(None))
+    return width, height